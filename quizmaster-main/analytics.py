@@ -0,0 +1,139 @@
+from flask import current_app
+from cache import TTLCache, on_commit
+from database import db, Subject, Chapter, Quiz, Question, Score, Answer
+
+try:
+    import numpy as np
+except ImportError:  # Analytics are skipped without numpy
+    np = None
+
+# Item analysis and score statistics, computed with NumPy.
+#
+# Each computation pulls the raw columns it needs in one query, turns them
+# into arrays and derives everything in vectorised passes: no per-row ORM
+# objects are built. Per-quiz results are cached by (quiz id, revision), so an
+# edit to the quiz recomputes them at once; new attempts show up after
+# ANALYTICS_TTL seconds.
+
+_quiz_analyses = TTLCache(maxsize=256, name='quiz_analytics')
+_overview = TTLCache(maxsize=1, name='analytics_overview')
+
+HISTOGRAM_BINS = 10  # 0-10%, 10-20%, ... 90-100%
+PERCENTILES = (25, 50, 75, 90)
+
+def _distribution(percentages):
+    """Histogram and summary statistics of an array of percentages."""
+    counts, _ = np.histogram(percentages, bins=HISTOGRAM_BINS, range=(0, 100))
+    summary = {
+        'attempts': int(percentages.size),
+        'histogram': counts.tolist(),
+        'mean': None,
+        'percentiles': {},
+    }
+    if percentages.size:
+        summary['mean'] = round(float(percentages.mean()), 1)
+        summary['percentiles'] = {
+            f'p{pct}': round(float(value), 1)
+            for pct, value in zip(PERCENTILES, np.percentile(percentages, PERCENTILES))
+        }
+    return summary
+
+def _item_statistics(score_ids, question_ids, correct):
+    """Difficulty and point-biserial discrimination for every question.
+
+    The answers are pivoted into an attempts x questions matrix of 0/1. An
+    item's discrimination is the correlation between answering it correctly
+    and the attempt's score on the *other* items (the corrected point-biserial),
+    so an item does not correlate with itself.
+    """
+    attempts, row = np.unique(score_ids, return_inverse=True)
+    items, column = np.unique(question_ids, return_inverse=True)
+    answered = np.zeros((attempts.size, items.size), dtype=bool)
+    right = np.zeros((attempts.size, items.size))
+    answered[row, column] = True
+    right[row, column] = correct
+
+    n = answered.sum(axis=0)
+    difficulty = right.sum(axis=0) / n  # Share of correct answers: high = easy
+
+    rest = right.sum(axis=1, keepdims=True) - right  # Score on the other items
+    rest_mean = (rest * answered).sum(axis=0) / n
+    rest_dev = (rest - rest_mean) * answered
+    item_dev = (right - difficulty) * answered
+    covariance = (item_dev * rest_dev).sum(axis=0) / n
+    spread = np.sqrt(difficulty * (1 - difficulty)) * np.sqrt((rest_dev ** 2).sum(axis=0) / n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        discrimination = np.where(spread > 0, covariance / spread, np.nan)
+
+    return {
+        int(question_id): {
+            'answers': int(count),
+            'difficulty': round(float(p), 3),
+            'discrimination': None if np.isnan(r) else round(float(r), 3),
+        }
+        for question_id, count, p, r in zip(items, n, difficulty, discrimination)
+    }
+
+def quiz_analysis(quiz):
+    """Score distribution and per-question statistics of ``quiz``, or None without numpy."""
+    if np is None:
+        return None
+    cached = _quiz_analyses.get(quiz.id)
+    if cached is not None and cached['revision'] == quiz.revision:
+        return cached
+
+    percentages = np.array(db.session.execute(
+        db.select(Score.percentage).where(Score.quiz_id == quiz.id)
+    ).scalars().all(), dtype=float)
+    rows = np.array(db.session.execute(
+        db.select(Answer.score_id, Answer.question_id, Answer.is_correct)
+        .join(Question, Answer.question_id == Question.id)  # Current questions only
+        .where(Answer.quiz_id == quiz.id)
+    ).all(), dtype=np.int64).reshape(-1, 3)
+
+    analysis = _distribution(percentages)
+    analysis['revision'] = quiz.revision
+    analysis['questions'] = _item_statistics(rows[:, 0], rows[:, 1], rows[:, 2]) if rows.size else {}
+    _quiz_analyses.set(quiz.id, analysis, ttl=current_app.config['ANALYTICS_TTL'])
+    return analysis
+
+def overview():
+    """Overall score distribution and the average score per subject, or None without numpy."""
+    if np is None:
+        return None
+    cached = _overview.get('overview')
+    if cached is not None:
+        return cached
+
+    subjects = db.session.execute(db.select(Subject.id, Subject.name).order_by(Subject.id)).all()
+    rows = np.array(db.session.execute(
+        db.select(Chapter.subject_id, Score.percentage)
+        .join(Quiz, Score.quiz_id == Quiz.id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+    ).all(), dtype=float).reshape(-1, 2)
+    subject_ids = rows[:, 0].astype(np.int64)
+    percentages = rows[:, 1]
+
+    # Per-subject sums and counts in one pass each, indexed by position in ``subjects``
+    index = np.searchsorted(np.array([subject.id for subject in subjects], dtype=np.int64), subject_ids)
+    totals = np.bincount(index, weights=percentages, minlength=len(subjects))
+    counts = np.bincount(index, minlength=len(subjects))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = totals / counts
+
+    result = _distribution(percentages)
+    result['subjects'] = [
+        {'name': subject.name, 'attempts': int(count), 'average': None if not count else round(float(average), 1)}
+        for subject, count, average in zip(subjects, counts, averages)
+    ]
+    _overview.set('overview', result, ttl=current_app.config['ANALYTICS_TTL'])
+    return result
+
+@on_commit(Quiz)
+def _drop_quiz_analyses(changes):
+    for quiz_id in changes.get(Quiz, ()):
+        _quiz_analyses.pop(quiz_id)
+
+@on_commit(Subject)
+def _drop_overview(changes):
+    _overview.clear()
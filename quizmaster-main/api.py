@@ -0,0 +1,241 @@
+import hashlib
+from flask import Blueprint, Response, current_app, request, url_for
+from flask_login import current_user
+from sqlalchemy.orm import joinedload
+from cache import TTLCache, on_commit
+from database import db, Subject, Chapter, Quiz, Question, QuizAttempt
+from grading import get_answer_key
+import attempts
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard json module
+    orjson = None
+    import json
+
+# Versioned JSON API for taking quizzes (mounted at /api/v1).
+#
+# Quiz metadata and question pages are serialized once per quiz revision and
+# the encoded bytes are cached, so a read is a cache lookup plus a revision
+# check; their ETags derive from the revision, so unchanged content is
+# answered with 304. Answers are submitted as one array of options in
+# question order (0 = unanswered), graded against the cached answer key and
+# handed to the score ingestor like a form submission.
+#
+# Answers belong to a timed attempt (see attempts.py): clients start one,
+# autosave into it with PUT and submit it before its deadline. Quizzes with a
+# question pool (see pools.py) draw their questions per attempt: those are
+# read from the attempt, and the answers follow the drawn order.
+#
+# Requests are authenticated by the session cookie. Submissions must be sent
+# as application/json, which a cross-site HTML form cannot do, so they need
+# no CSRF token.
+
+api_bp = Blueprint('api', __name__)
+
+_payloads = TTLCache(maxsize=2048, name='api_payloads')
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+def loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def json_response(data, status=200):
+    return Response(dumps(data), status=status, mimetype='application/json')
+
+def error(status, message):
+    return json_response({'error': message}, status)
+
+def _cached_payload(key, revision, build):
+    """``(body, etag)`` for ``key``, serialized at most once per quiz revision."""
+    cached = _payloads.get(key)
+    if cached is None or cached[0] != revision:
+        body = dumps(build())
+        cached = (revision, body, hashlib.sha1(body).hexdigest())
+        _payloads.set(key, cached)
+    return cached[1], cached[2]
+
+def _conditional(body, etag):
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def _read_answers():
+    """The ``answers`` array and the whole body of a JSON request, or an error response."""
+    if not request.is_json:
+        return None, None, error(415, 'Send the answers as application/json.')
+    try:
+        data = loads(request.get_data())
+    except ValueError:
+        return None, None, error(400, 'Invalid JSON.')
+    answers = data.get('answers') if isinstance(data, dict) else None
+    if not isinstance(answers, list):
+        return None, None, error(400, '"answers" must be an array of options, one per question.')
+    return answers, data, None
+
+def _attempt_json(attempt, saved_answers):
+    return {
+        'id': attempt.id,
+        'quiz_id': attempt.quiz_id,
+        'revision': attempt.revision,
+        'started_at': attempt.started_at.isoformat() + 'Z',
+        'deadline': attempt.deadline.isoformat() + 'Z' if attempt.deadline else None,
+        'question_ids': attempts.question_ids(attempt),  # None: every question of the quiz, in id order
+        'answers': [int(digit) for digit in saved_answers],
+    }
+
+@api_bp.before_request
+def _students_only():
+    if not current_user.is_authenticated:
+        return error(401, 'Log in first.')
+    if current_user.is_admin:
+        return error(403, 'Quizzes are taken by students only.')
+
+@api_bp.errorhandler(404)
+def _not_found(e):
+    return error(404, 'Not found.')
+
+@api_bp.route('/quizzes/<int:quiz_id>')
+def quiz_metadata(quiz_id):
+    quiz = Quiz.query.options(joinedload(Quiz.chapter).joinedload(Chapter.subject)).get_or_404(quiz_id)
+
+    def build():
+        page_size = current_app.config['API_QUESTIONS_PER_PAGE']
+        question_count = len(get_answer_key(quiz))
+        return {
+            'id': quiz.id,
+            'title': quiz.title,
+            'chapter': {'id': quiz.chapter.id, 'name': quiz.chapter.name},
+            'subject': {'id': quiz.chapter.subject.id, 'name': quiz.chapter.subject.name},
+            'date_of_quiz': quiz.date_of_quiz.isoformat(),
+            'duration_seconds': attempts.duration_seconds(quiz),
+            'remarks': quiz.remarks,
+            'revision': quiz.revision,
+            'question_count': question_count,
+            'pool_size': quiz.pool_size,  # Questions drawn per attempt, if set
+            'page_size': page_size,
+            'pages': -(-question_count // page_size),
+        }
+
+    return _conditional(*_cached_payload(('quiz', quiz.id), quiz.revision, build))
+
+@api_bp.route('/quizzes/<int:quiz_id>/questions')
+def quiz_questions(quiz_id):
+    quiz = db.get_or_404(Quiz, quiz_id)
+    if quiz.pool_size:
+        return error(403, 'This quiz draws its questions per attempt; read them from the attempt.')
+    page = max(request.args.get('page', 1, type=int), 1)
+    page_size = current_app.config['API_QUESTIONS_PER_PAGE']
+
+    def build():
+        rows = db.session.execute(
+            db.select(Question.id, Question.question_text, Question.option1, Question.option2,
+                      Question.option3, Question.option4)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.id)
+            .offset((page - 1) * page_size)
+            .limit(page_size + 1)
+        ).all()
+        # Each question is [id, text, [option1..option4]], unused options null
+        return {
+            'quiz_id': quiz.id,
+            'revision': quiz.revision,
+            'page': page,
+            'has_next': len(rows) > page_size,
+            'questions': [[row[0], row[1], list(row[2:])] for row in rows[:page_size]],
+        }
+
+    return _conditional(*_cached_payload(('questions', quiz.id, page), quiz.revision, build))
+
+@api_bp.route('/quizzes/<int:quiz_id>/attempts', methods=['POST'])
+def start_attempt(quiz_id):
+    """Start an attempt, or return the open one with its saved answers."""
+    quiz = db.get_or_404(Quiz, quiz_id)
+    attempt, expired = attempts.start_attempt(current_user.id, quiz)
+    data = _attempt_json(attempt, attempts.saved_answers(attempt))
+    if expired:
+        data['expired_attempt'] = {'score': expired.score, 'percentage': expired.percentage}
+    return json_response(data)
+
+@api_bp.route('/attempts/<int:attempt_id>/questions')
+def attempt_questions(attempt_id):
+    """The questions drawn for an attempt at a quiz with a question pool, in order."""
+    attempt = db.get_or_404(QuizAttempt, attempt_id)
+    if attempt.user_id != current_user.id:
+        return error(404, 'Not found.')
+    drawn = attempts.question_ids(attempt)
+    if drawn is None:
+        return error(404, 'This quiz has no question pool; read its questions from the quiz.')
+    rows = {row[0]: row for row in db.session.execute(
+        db.select(Question.id, Question.question_text, Question.option1, Question.option2,
+                  Question.option3, Question.option4)
+        .where(Question.id.in_(drawn))
+    )}
+    # Same layout as quiz_questions; the draw only changes with the attempt or the revision
+    body = dumps({
+        'attempt_id': attempt.id,
+        'revision': attempt.revision,
+        'questions': [[row[0], row[1], list(row[2:])] for row in map(rows.get, drawn) if row],
+    })
+    return _conditional(body, hashlib.sha1(body).hexdigest())
+
+@api_bp.route('/attempts/<int:attempt_id>', methods=['PUT'])
+def autosave_attempt(attempt_id):
+    attempt = db.get_or_404(QuizAttempt, attempt_id)
+    if attempt.user_id != current_user.id:
+        return error(404, 'Not found.')
+    answers, _, failure = _read_answers()
+    if failure:
+        return failure
+    try:
+        attempts.save_answers(attempt, db.session.get(Quiz, attempt.quiz_id), answers)
+    except attempts.AttemptClosed:
+        return error(409, 'The attempt was already submitted.')
+    except attempts.AttemptExpired:
+        return error(410, 'Time is up.')
+    except attempts.QuizChanged:
+        return error(409, 'The quiz has changed; reload it.')
+    except ValueError as e:
+        return error(400, str(e))
+    return Response(status=204)
+
+@api_bp.route('/quizzes/<int:quiz_id>/submissions', methods=['POST'])
+def submit_quiz(quiz_id):
+    quiz = db.get_or_404(Quiz, quiz_id)
+    answers, data, failure = _read_answers()
+    if failure:
+        return failure
+    if data.get('revision') != quiz.revision:
+        # Questions were added, removed or changed since the client loaded them
+        return json_response({'error': 'The quiz has changed; reload it.', 'revision': quiz.revision}, 409)
+    attempt = attempts.open_attempt(current_user.id, quiz.id)
+    if attempt is None:
+        return error(409, 'Start an attempt first.')
+
+    try:
+        selected = attempts.answer_key(attempt, quiz).selected_from_list(answers)
+        entry, late = attempts.submit_attempt(attempt, quiz, selected)
+    except ValueError as e:
+        return error(400, str(e))
+    except attempts.AttemptClosed:
+        return error(409, 'The attempt was already submitted.')
+    return json_response({
+        'score': entry.score,
+        'total_questions': entry.total_questions,
+        'percentage': entry.percentage,
+        'late': late,  # Past the deadline: the autosaved answers were graded instead
+        'results_url': url_for('user.quiz_results', quiz_id=quiz.id),
+    }, 201)
+
+@on_commit(Chapter, Subject)
+def _drop_payloads(changes):
+    # Quiz edits bump the revision, but metadata also shows the chapter and
+    # subject names; renames are rare, so drop everything
+    _payloads.clear()
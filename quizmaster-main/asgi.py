@@ -0,0 +1,13 @@
+"""ASGI entry point: ``uvicorn asgi:app --workers 4``.
+
+The views are synchronous; asgiref runs each request in a thread of its own
+pool, so this mode serves the same app as wsgi.py under an ASGI server.
+"""
+from main import create_app
+
+try:
+    from asgiref.wsgi import WsgiToAsgi
+except ImportError as e:
+    raise ImportError('The ASGI entry point needs asgiref (pip install asgiref uvicorn).') from e
+
+app = WsgiToAsgi(create_app())
@@ -0,0 +1,239 @@
+import atexit
+import logging
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import bindparam, update
+from sqlalchemy.exc import SQLAlchemyError
+from database import db, QuizAttempt
+from grading import get_answer_key
+from ingest import score_ingestor
+import pools
+
+log = logging.getLogger(__name__)
+
+# Timed quiz attempts.
+#
+# Opening a quiz starts a QuizAttempt with a server-side deadline derived
+# from Quiz.time_duration; the page's countdown only displays it. Answers are
+# autosaved as the student goes, as a compact string with one digit per
+# question. Autosaves are coalesced in memory (the latest answers per
+# attempt) and written every AUTOSAVE_FLUSH_INTERVAL seconds in one
+# executemany UPDATE, so a student clicking through a quiz costs one write
+# per interval, not one per click. (With several worker processes, answers
+# buffered by another process show up after at most one interval.)
+#
+# A submission that arrives after the deadline (plus QUIZ_DEADLINE_GRACE
+# seconds for the network) is not trusted: the attempt is graded with the
+# answers autosaved before the deadline instead. An attempt left open past
+# its deadline (closed tab) is graded the same way when the student opens the
+# quiz again.
+#
+# For a quiz with a question pool, the attempt draws its questions when it
+# starts (see pools.py) and keeps the seed and the drawn ids; the answers, the
+# page and the grading then cover those questions only, in the drawn order.
+
+class AttemptClosed(Exception):
+    """The attempt was already submitted."""
+
+class AttemptExpired(Exception):
+    """The attempt's deadline has passed."""
+
+class QuizChanged(Exception):
+    """The quiz's questions changed since the attempt started."""
+
+def duration_seconds(quiz):
+    """Quiz.time_duration ("HH:MM") in seconds, or None if it is not a valid duration."""
+    hours, _, minutes = quiz.time_duration.partition(':')
+    try:
+        seconds = int(hours) * 3600 + int(minutes or 0) * 60
+    except ValueError:
+        return None
+    return seconds or None
+
+def is_expired(attempt, now=None):
+    """True once ``attempt``'s deadline and the grace period have passed."""
+    if attempt.deadline is None:
+        return False
+    grace = timedelta(seconds=current_app.config['QUIZ_DEADLINE_GRACE'])
+    return (now or datetime.utcnow()) > attempt.deadline + grace
+
+def question_ids(attempt):
+    """The ids drawn for ``attempt``, or None if it covers every question of the quiz."""
+    return [int(question_id) for question_id in attempt.question_ids.split(',')] if attempt.question_ids else None
+
+def answer_key(attempt, quiz):
+    """The AnswerKey of the questions ``attempt`` covers."""
+    key = get_answer_key(quiz)
+    drawn = question_ids(attempt)
+    return key if drawn is None else key.subset(drawn)
+
+def _draw(attempt, quiz):
+    drawn = pools.draw_questions(quiz, attempt.seed)
+    attempt.question_ids = ','.join(map(str, drawn)) if drawn is not None else ''
+
+def open_attempt(user_id, quiz_id):
+    """The user's unsubmitted attempt at the quiz, or None."""
+    return QuizAttempt.query.filter_by(user_id=user_id, quiz_id=quiz_id, submitted_at=None) \
+        .order_by(QuizAttempt.id.desc()).first()
+
+def start_attempt(user_id, quiz):
+    """Return ``(attempt, expired)``: the open attempt or a new one, and the
+    PendingScore of an open attempt that had run out of time and was submitted."""
+    attempt = open_attempt(user_id, quiz.id)
+    expired = None
+    if attempt is not None and is_expired(attempt):
+        expired, _ = submit_attempt(attempt, quiz)
+        attempt = None
+    elif attempt is not None and attempt.revision != quiz.revision:
+        # The questions changed: the saved answers no longer line up with them
+        autosaves.discard(attempt.id)
+        attempt.revision, attempt.answers = quiz.revision, ''
+        if quiz.pool_size and attempt.seed is None:
+            attempt.seed = pools.new_seed()  # The quiz got a pool since the attempt started
+        _draw(attempt, quiz)  # Same seed, current questions
+        db.session.commit()
+    if attempt is None:
+        now = datetime.utcnow()
+        seconds = duration_seconds(quiz)
+        attempt = QuizAttempt(user_id=user_id, quiz_id=quiz.id, revision=quiz.revision, started_at=now,
+                              deadline=now + timedelta(seconds=seconds) if seconds else None,
+                              seed=pools.new_seed() if quiz.pool_size else None)
+        _draw(attempt, quiz)
+        db.session.add(attempt)
+        db.session.commit()
+    return attempt, expired
+
+def saved_answers(attempt):
+    """The latest autosaved answers of ``attempt`` (digit string), buffered or stored."""
+    return autosaves.get(attempt.id, attempt.answers)
+
+def save_answers(attempt, quiz, options):
+    """Autosave ``options`` (one per question of the attempt, see AnswerKey.selected_from_list)."""
+    if attempt.submitted_at is not None:
+        raise AttemptClosed()
+    if is_expired(attempt):
+        raise AttemptExpired()
+    if attempt.revision != quiz.revision:
+        raise QuizChanged()
+    selected = answer_key(attempt, quiz).selected_from_list(options)  # ValueError if malformed
+    autosaves.save(attempt.id, ''.join(map(str, selected)))
+
+def submit_attempt(attempt, quiz, selected=None):
+    """Close ``attempt``, grade it and queue its score; return ``(PendingScore, late)``.
+
+    ``selected`` holds the submitted options (array as from the attempt's
+    answer_key); it is ignored once the deadline has passed (``late``), and the
+    autosaved answers are graded instead.
+    """
+    key = answer_key(attempt, quiz)
+    late = is_expired(attempt)
+    if selected is None or late:
+        saved = saved_answers(attempt)
+        if attempt.revision == quiz.revision and len(saved) == len(key):
+            selected = key.selected_from_list([int(digit) for digit in saved])
+        else:
+            selected = key.selected_from_list([0] * len(key))  # Answers refer to other questions
+
+    # Close the attempt first: of two concurrent submissions only one is graded
+    closed = db.session.execute(
+        update(QuizAttempt)
+        .where(QuizAttempt.id == attempt.id, QuizAttempt.submitted_at.is_(None))
+        .values(submitted_at=datetime.utcnow(), answers=''.join(map(str, selected)))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    autosaves.discard(attempt.id)
+    if not closed:
+        raise AttemptClosed()
+
+    score = key.count_correct(selected)
+    entry = score_ingestor.submit(
+        user_id=attempt.user_id,
+        quiz_id=quiz.id,
+        score=score,
+        total_questions=len(key),
+        percentage=(score/len(key))*100 if len(key) else 0,
+        answers=key.answer_rows(selected)
+    )
+    return entry, late
+
+
+class AutosaveBuffer:
+    """Latest autosaved answers per attempt, written to the database periodically."""
+
+    def __init__(self):
+        self.app = None
+        self.saves = 0
+        self.writes = 0
+        self._pending = {}  # attempt id -> (answers, saved_at)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        if app.config['AUTOSAVE_FLUSH_INTERVAL'] <= 0:
+            return  # Write every autosave at once
+        self._thread = threading.Thread(target=self._run, name='autosave-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def save(self, attempt_id, answers):
+        with self._lock:
+            self._pending[attempt_id] = (answers, datetime.utcnow())
+            self.saves += 1
+        if self._thread is None:
+            self.flush()
+
+    def get(self, attempt_id, default=None):
+        entry = self._pending.get(attempt_id)
+        return entry[0] if entry else default
+
+    def discard(self, attempt_id):
+        with self._lock:
+            self._pending.pop(attempt_id, None)
+
+    def stop(self):
+        """Write what is buffered and stop the background thread."""
+        if self._thread and self._thread.is_alive():
+            self._stopping.set()
+            self._thread.join(timeout=30)
+
+    def _run(self):
+        interval = self.app.config['AUTOSAVE_FLUSH_INTERVAL']
+        while not self._stopping.wait(interval):
+            with self.app.app_context():
+                self.flush()
+        with self.app.app_context():
+            self.flush()
+
+    def flush(self):
+        """Write the buffered answers in one executemany UPDATE."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        statement = (
+            update(QuizAttempt.__table__)
+            .where(QuizAttempt.id == bindparam('attempt_id'), QuizAttempt.submitted_at.is_(None))
+            .values(answers=bindparam('new_answers'), saved_at=bindparam('new_saved_at'))
+        )
+        try:
+            db.session.execute(statement, [
+                {'attempt_id': attempt_id, 'new_answers': answers, 'new_saved_at': saved_at}
+                for attempt_id, (answers, saved_at) in batch.items()
+            ])
+            db.session.commit()
+        except SQLAlchemyError:
+            # Keep the answers for the next round, unless newer ones came in
+            log.exception('Writing %d autosave(s) failed; retrying', len(batch))
+            db.session.rollback()
+            with self._lock:
+                for attempt_id, entry in batch.items():
+                    self._pending.setdefault(attempt_id, entry)
+            return
+        self.writes += 1
+
+
+autosaves = AutosaveBuffer()
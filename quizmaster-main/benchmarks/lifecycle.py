@@ -0,0 +1,327 @@
+"""Latency, throughput and SQL query counts of the quiz lifecycle, with baselines.
+
+Usage (from quizmaster-main/):
+    python benchmarks/lifecycle.py [--workers 4] [--iterations 25] [--users 200] ...
+    python benchmarks/lifecycle.py --save-baseline     # record the current numbers
+    python benchmarks/lifecycle.py --check             # exit 1 on a regression
+
+Seeds a fresh SQLite database with a synthetic catalogue (subjects, chapters,
+quizzes, questions), students and past scores, then has ``--workers``
+concurrent students go through login -> dashboard -> quiz page -> submission
+-> results -> logout, while an admin loads the admin dashboard once per
+iteration. Requests go through the Flask test client, or with ``--server``
+through a threaded local WSGI server over HTTP.
+
+Each step is reported with its throughput, p50/p95/p99 latency and the mean
+number of SQL statements it issued. The numbers are compared with the
+baseline file (benchmarks/baselines/lifecycle.json by default): a step whose
+p95 grew by more than ``--tolerance`` or that issues more queries than before
+is flagged. Baselines are machine-specific; record them on the machine that
+runs the comparison.
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if __name__ == '__main__':  # Not when the password hashing processes import this module
+    _tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{_tmp}/bench.db'
+    os.environ.setdefault('SCORE_JOURNAL_DIR', os.path.join(_tmp, 'score_journal'))
+
+from sqlalchemy import event, insert
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+from main import create_app, start_services
+from database import db, User, Subject, Chapter, Quiz, Question, Score
+from leaderboard import rebuild_leaderboards
+from search import reindex_quizzes
+from stats import rebuild_user_stats
+import passwords
+from schema import init_db
+
+app = None  # Created by main()
+
+def create_bench_app():
+    """The app, with its tables created and its services started."""
+    logging.getLogger('main').setLevel(logging.ERROR)  # No "missing tables" warning: they are created next
+    bench_app = create_app()
+    with bench_app.app_context():
+        init_db()
+    start_services(bench_app)
+    return bench_app
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'lifecycle.json')
+PASSWORD = 'bench-password'
+ADMIN_EMAIL, ADMIN_PASSWORD = 'bench-admin@example.com', 'bench-admin-password'
+STEPS = ('login', 'user_dashboard', 'quiz_page', 'submit_quiz', 'quiz_results', 'logout', 'admin_dashboard')
+
+# -- dataset -------------------------------------------------------------------
+
+def seed(args):
+    """Fill the database with bulk inserts; return ``(student emails, {quiz id: question ids})``."""
+    password = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+    rng = random.Random(args.seed)
+    today = date.today()
+    with app.app_context():
+        session = db.session
+        session.execute(insert(User), [
+            {'id': 1000 + n, 'username': f'student{n}', 'email': f'student{n}@example.com', 'password': password,
+             'full_name': f'Student {n}', 'qualification': '-', 'dob': date(2000, 1, 1)}
+            for n in range(args.users)
+        ])
+        session.execute(insert(Subject), [{'id': s + 1, 'name': f'Subject {s}', 'description': 'Benchmark'}
+                                          for s in range(args.subjects)])
+        chapters = [{'id': s * args.chapters + c + 1, 'name': f'Chapter {s}.{c}', 'subject_id': s + 1}
+                    for s in range(args.subjects) for c in range(args.chapters)]
+        session.execute(insert(Chapter), chapters)
+        quizzes = [{'id': n + 1, 'title': f'Quiz {n}', 'chapter_id': chapter['id'], 'date_of_quiz': today,
+                    'time_duration': '00:30', 'remarks': 'Benchmark'}
+                   for n, chapter in enumerate(chapter for chapter in chapters for _ in range(args.quizzes))]
+        session.execute(insert(Quiz), quizzes)
+        questions, quiz_questions = [], {}
+        for quiz in quizzes:
+            for n in range(args.questions):
+                question_id = len(questions) + 1
+                questions.append({'id': question_id, 'quiz_id': quiz['id'], 'question_text': f'Question {n}?',
+                                  'option1': 'A', 'option2': 'B', 'option3': 'C', 'option4': 'D',
+                                  'correct_option': rng.randint(1, 4)})
+                quiz_questions.setdefault(quiz['id'], []).append(question_id)
+        session.execute(insert(Question), questions)
+        now = datetime.utcnow()
+        session.execute(insert(Score), [
+            {'user_id': 1000 + rng.randrange(args.users), 'quiz_id': rng.randrange(len(quizzes)) + 1,
+             'score': (correct := rng.randint(0, args.questions)), 'total_questions': args.questions,
+             'percentage': correct / args.questions * 100, 'time_stamp_of_attempt': now - timedelta(minutes=n)}
+            for n in range(args.scores)
+        ])
+        # Derived tables the app keeps up to date itself on normal writes
+        connection = session.connection()
+        rebuild_user_stats(connection)
+        rebuild_leaderboards(connection)
+        reindex_quizzes(connection)
+        session.commit()
+    return [f'student{n}@example.com' for n in range(args.users)], quiz_questions
+
+# -- query counting --------------------------------------------------------------
+# Statements are counted per thread (the request runs on the thread that
+# serves it) and returned in a response header, so the count is exact with
+# concurrent workers and works the same over HTTP.
+
+_local = threading.local()
+
+def install_query_counter():
+    with app.app_context():
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            if getattr(_local, 'counting', False):
+                _local.queries += 1
+
+    @app.before_request
+    def _start_counting():
+        _local.counting, _local.queries = True, 0
+
+    @app.after_request
+    def _report_count(response):
+        response.headers['X-Query-Count'] = str(_local.queries)
+        _local.counting = False
+        return response
+
+# -- clients ------------------------------------------------------------------------
+
+class TestClientSession:
+    def __init__(self, base=None):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        return response.status_code, int(response.headers.get('X-Query-Count', 0))
+
+class HTTPSession:
+    """The same interface over HTTP, with a cookie jar and no redirect following."""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base):
+        self.base = base
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), self._NoRedirect)
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            response = self.opener.open(urllib.request.Request(self.base + path, data=body, method=method))
+        except urllib.error.HTTPError as e:
+            response = e  # Redirects and errors are answers too
+        response.read()
+        return response.status, int(response.headers.get('X-Query-Count', 0))
+
+# -- run -------------------------------------------------------------------------------
+
+def run(args, session_class, base, emails, quiz_questions):
+    samples = {step: [] for step in STEPS}  # step -> [(seconds, queries, status)]
+    lock = threading.Lock()
+
+    def timed(client, step, method, path, data=None):
+        started = time.perf_counter()
+        status, queries = client.request(method, path, data)
+        elapsed = time.perf_counter() - started
+        with lock:
+            samples[step].append((elapsed, queries, status))
+
+    def student(worker):
+        rng = random.Random(args.seed * 1000 + worker)
+        client, admin = session_class(base), session_class(base)
+        admin.request('POST', '/auth/login', {'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD})
+        for _ in range(args.iterations):
+            email = emails[rng.randrange(len(emails))]
+            quiz_id = rng.choice(list(quiz_questions))
+            answers = {f'question_{question_id}': str(rng.randint(1, 4)) for question_id in quiz_questions[quiz_id]}
+            timed(client, 'login', 'POST', '/auth/login', {'email': email, 'password': PASSWORD})
+            timed(client, 'user_dashboard', 'GET', '/user/dashboard')
+            timed(client, 'quiz_page', 'GET', f'/user/quiz/{quiz_id}')
+            timed(client, 'submit_quiz', 'POST', f'/user/quiz/{quiz_id}', answers)
+            timed(client, 'quiz_results', 'GET', f'/user/quiz/{quiz_id}/results')
+            timed(client, 'logout', 'GET', '/auth/logout')
+            timed(admin, 'admin_dashboard', 'GET', '/admin/dashboard')
+
+    threads = [threading.Thread(target=student, args=(worker,)) for worker in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+def percentile(values, pct):
+    return statistics.quantiles(values, n=100)[pct - 1] if len(values) > 1 else values[0]
+
+def summarize(samples, wall_time):
+    report = {}
+    for step, rows in samples.items():
+        latencies = [row[0] * 1000 for row in rows]
+        report[step] = {
+            'requests': len(rows),
+            'per_second': round(len(rows) / wall_time, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries': round(statistics.mean(row[1] for row in rows), 2),
+            'errors': sum(1 for row in rows if row[2] >= 400),
+        }
+    return report
+
+def compare(report, baseline, tolerance):
+    """Lines describing regressions against ``baseline``."""
+    regressions = []
+    for step, current in report.items():
+        before = baseline['steps'].get(step)
+        if before is None:
+            continue
+        if current['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{step}: p95 {before['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > before['queries'] + 0.5:
+            regressions.append(f"{step}: queries {before['queries']} -> {current['queries']}")
+        if current['errors'] > before.get('errors', 0):
+            regressions.append(f"{step}: errors {before.get('errors', 0)} -> {current['errors']}")
+    return regressions
+
+def main():
+    global app
+    app = create_bench_app()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    dataset = parser.add_argument_group('dataset')
+    dataset.add_argument('--subjects', type=int, default=10)
+    dataset.add_argument('--chapters', type=int, default=5, help='per subject')
+    dataset.add_argument('--quizzes', type=int, default=4, help='per chapter')
+    dataset.add_argument('--questions', type=int, default=20, help='per quiz')
+    dataset.add_argument('--users', type=int, default=200)
+    dataset.add_argument('--scores', type=int, default=20000)
+    dataset.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=25, help='lifecycles per worker')
+    parser.add_argument('--server', action='store_true', help='go through a local threaded WSGI server')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='allowed p95 growth (0.5 = +50%%)')
+    args = parser.parse_args()
+
+    app.config.update(WTF_CSRF_ENABLED=False, LOGIN_RATE_LIMITS={'ip': (10 ** 9, 60), 'email': (10 ** 9, 60)})
+    started = time.perf_counter()
+    emails, quiz_questions = seed(args)
+    with app.app_context():
+        db.session.add(User(username='bench-admin', email=ADMIN_EMAIL, full_name='Bench Admin', qualification='-',
+                            password=generate_password_hash(ADMIN_PASSWORD), dob=date(2000, 1, 1), is_admin=True))
+        db.session.commit()
+    print(f'Seeded {len(quiz_questions)} quizzes, {args.users} users, {args.scores} scores '
+          f'in {time.perf_counter() - started:.1f}s')
+    install_query_counter()
+
+    server = None
+    if args.server:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session_class, base = HTTPSession, f'http://127.0.0.1:{server.server_port}'
+    else:
+        session_class, base = TestClientSession, None
+
+    samples, wall_time = run(args, session_class, base, emails, quiz_questions)
+    if server:
+        server.shutdown()
+    passwords.shutdown()
+    report = summarize(samples, wall_time)
+
+    lifecycles = args.workers * args.iterations
+    print(f"{lifecycles} lifecycles by {args.workers} worker(s) in {wall_time:.1f}s "
+          f"({lifecycles / wall_time:.1f}/s, {'HTTP' if args.server else 'test client'})")
+    print(f"{'step':<18}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}{'errors':>8}")
+    for step, row in report.items():
+        print(f"{step:<18}{row['per_second']:>8}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+              f"{row['queries']:>9}{row['errors']:>8}")
+
+    settings = {name: getattr(args, name) for name in
+                ('subjects', 'chapters', 'quizzes', 'questions', 'users', 'scores', 'workers', 'iterations', 'server')}
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+                       'machine': f'{platform.platform()}, {os.cpu_count()} CPU(s)',
+                       'settings': settings, 'steps': report}, f, indent=2)
+            f.write('\n')
+        print(f'Baseline saved to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print('No baseline to compare with (record one with --save-baseline).')
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline['settings'] != settings:
+        print(f"Warning: the baseline was recorded with other settings: {baseline['settings']}")
+    regressions = compare(report, baseline, args.tolerance)
+    for line in regressions:
+        print(f'REGRESSION {line}')
+    if not regressions:
+        print(f"No regression against the baseline of {baseline['recorded_at']}.")
+    elif args.check:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Latency of ordinary pages during a login storm, inline vs pooled password hashing.
+
+Usage (from quizmaster-main/):
+    python benchmarks/login_storm.py [--logins 16] [--seconds 10]
+
+Serves the app with the threaded development server on a fresh SQLite
+database. ``--logins`` threads post logins back to back while one probe
+thread, already logged in, keeps loading the user dashboard; the probe's
+p50/p95/p99 latency is reported for each hashing mode.
+"""
+import argparse
+import http.cookiejar
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if __name__ == '__main__':  # Not when the password hashing processes import this module
+    _tmp = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = f'sqlite:///{_tmp}/bench.db'
+    os.environ['SCORE_WRITE_BEHIND'] = '0'
+
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import make_server
+from main import create_app, start_services
+from database import db, User
+import passwords
+from schema import init_db
+
+app = None  # Created by main()
+
+def create_bench_app():
+    """The app, with its tables created and its services started."""
+    logging.getLogger('main').setLevel(logging.ERROR)  # No "missing tables" warning: they are created next
+    bench_app = create_app()
+    with bench_app.app_context():
+        init_db()
+    start_services(bench_app)
+    return bench_app
+
+EMAIL, PASSWORD = 'storm@example.com', 'storm-password'
+
+def opener():
+    return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+def login(client, base):
+    data = urllib.parse.urlencode({'email': EMAIL, 'password': PASSWORD}).encode()
+    client.open(f'{base}/auth/login', data=data).read()
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] * 1000 if len(samples) > 1 else float('nan')
+
+def run(base, workers, logins, seconds):
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    passwords.shutdown()
+
+    probe = opener()
+    login(probe, base)
+    stop = threading.Event()
+    latencies, login_count = [], [0]
+
+    def stormer():
+        client = urllib.request.build_opener()  # No cookies: every post is a fresh login
+        while not stop.is_set():
+            try:
+                login(client, base)
+            except OSError:
+                pass  # 503 while the hashing queue is full
+            login_count[0] += 1
+
+    def prober():
+        while not stop.is_set():
+            started = time.perf_counter()
+            probe.open(f'{base}/user/dashboard').read()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=stormer) for _ in range(logins)] + [threading.Thread(target=prober)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, login_count[0] / seconds
+
+def main():
+    global app
+    app = create_bench_app()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--hash-workers', type=int, default=app.config['PASSWORD_HASH_WORKERS'] or 2)
+    args = parser.parse_args()
+
+    app.config.update(WTF_CSRF_ENABLED=False, LOGIN_RATE_LIMITS={'ip': (10 ** 9, 60), 'email': (10 ** 9, 60)})
+    with app.app_context():
+        db.session.add(User(username='storm', email=EMAIL, password=generate_password_hash(PASSWORD),
+                            full_name='Storm User', qualification='-', dob=date(2000, 1, 1)))
+        db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    print(f'{args.logins} login threads, {args.seconds:g}s per mode, {os.cpu_count()} CPU(s)')
+    print(f"{'hashing':<16}{'logins/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'probes':>8}")
+    for name, workers in (('inline', 0), (f'pool({args.hash_workers})', args.hash_workers)):
+        latencies, login_rate = run(base, workers, args.logins, args.seconds)
+        print(f'{name:<16}{login_rate:>10.1f}{percentile(latencies, 50):>10.1f}'
+              f'{percentile(latencies, 95):>10.1f}{percentile(latencies, 99):>10.1f}{len(latencies):>8}')
+
+    server.shutdown()
+    passwords.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Startup time and throughput of the development server vs the production servers.
+
+Usage (from quizmaster-main/):
+    python benchmarks/server_modes.py [--clients 16] [--seconds 10] [--workers 4]
+
+Creates a database with ``flask init-db`` and a small catalogue, then starts
+the app in each mode in turn as its own process group:
+
+    dev       flask run (Werkzeug, threaded, one process)
+    gunicorn  gunicorn -c gunicorn.conf.py wsgi:app (gthread workers)
+    uvicorn   uvicorn asgi:app (the WSGI app behind asgiref, one thread pool per worker)
+
+Startup is the time from launching the server until it first answers 200.
+``--clients`` threads, each logged in as the admin, then load the admin
+dashboard, subject list and quiz list round-robin for ``--seconds``; requests
+per second and p50/p95/p99 latency are reported. Modes whose server is not
+installed are skipped.
+"""
+import argparse
+import http.cookiejar
+import os
+import re
+import shutil
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, insert
+from database import Subject, Chapter, Quiz, Question
+
+ADMIN_EMAIL, ADMIN_PASSWORD = 'bench-admin@example.com', 'bench-admin-password'
+PAGES = ('/admin/dashboard', '/admin/subjects', '/admin/quizzes')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def commands(port, workers, threads):
+    """``name -> argv`` of the modes whose server is installed."""
+    modes = {'dev': [sys.executable, '-m', 'flask', '--app', 'main', 'run', '--port', str(port), '--with-threads']}
+    if shutil.which('gunicorn'):
+        modes['gunicorn'] = ['gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+                             '--workers', str(workers), '--threads', str(threads), 'wsgi:app']
+    if shutil.which('uvicorn'):
+        modes['uvicorn'] = ['uvicorn', 'asgi:app', '--port', str(port), '--workers', str(workers),
+                            '--log-level', 'warning', '--no-access-log']
+    return modes
+
+# -- dataset -------------------------------------------------------------------
+
+def seed(env, database, subjects=10, chapters=5, quizzes=4, questions=20):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'main', 'init-db',
+                    '--admin-email', ADMIN_EMAIL, '--admin-password', ADMIN_PASSWORD],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    engine = create_engine(f'sqlite:///{database}')
+    with engine.begin() as conn:
+        conn.execute(insert(Subject), [{'id': s + 1, 'name': f'Subject {s}', 'description': 'Benchmark'}
+                                       for s in range(subjects)])
+        conn.execute(insert(Chapter), [{'id': s * chapters + c + 1, 'name': f'Chapter {s}.{c}', 'subject_id': s + 1}
+                                       for s in range(subjects) for c in range(chapters)])
+        quiz_rows = [{'id': n + 1, 'title': f'Quiz {n}', 'chapter_id': n // quizzes + 1, 'date_of_quiz': date.today(),
+                      'time_duration': '00:30', 'remarks': 'Benchmark'}
+                     for n in range(subjects * chapters * quizzes)]
+        conn.execute(insert(Quiz), quiz_rows)
+        conn.execute(insert(Question), [{'quiz_id': quiz['id'], 'question_text': f'Question {n}?', 'option1': 'A',
+                                         'option2': 'B', 'option3': 'C', 'option4': 'D', 'correct_option': 1}
+                                        for quiz in quiz_rows for n in range(questions)])
+    engine.dispose()
+
+# -- clients ------------------------------------------------------------------------
+
+def login(base):
+    client = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    page = client.open(f'{base}/auth/login').read().decode()
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    data = urllib.parse.urlencode({'email': ADMIN_EMAIL, 'password': ADMIN_PASSWORD, 'csrf_token': token}).encode()
+    if not client.open(f'{base}/auth/login', data=data).geturl().endswith('/admin/dashboard'):
+        raise RuntimeError('Could not log in as the admin.')
+    return client
+
+def wait_until_up(base, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'The server exited with status {process.returncode}.')
+        try:
+            with urllib.request.urlopen(f'{base}/auth/login', timeout=1) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.02)
+    raise RuntimeError(f'The server did not answer within {timeout}s.')
+
+def load(base, clients, seconds):
+    sessions = [login(base) for _ in range(clients)]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def client(session, offset):
+        n = offset
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                session.open(base + PAGES[n % len(PAGES)]).read()
+            except (urllib.error.URLError, ConnectionError, OSError):
+                with lock:
+                    errors[0] += 1
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+            n += 1
+
+    threads = [threading.Thread(target=client, args=(session, i)) for i, session in enumerate(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+def percentile(samples, pct):
+    return statistics.quantiles(samples, n=100)[pct - 1] * 1000 if len(samples) > 1 else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4, help='processes of the production servers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--modes', nargs='*', help='default: every installed mode')
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    database = os.path.join(tmp, 'bench.db')
+    env = dict(os.environ,
+               DATABASE_URL=f'sqlite:///{database}',
+               SCORE_JOURNAL_DIR=os.path.join(tmp, 'score_journal'),
+               SECRET_KEY='bench-secret-key',  # Shared by the workers, so a session works on all of them
+               LOGIN_RATE_PER_IP='1000000', LOGIN_RATE_PER_EMAIL='1000000',
+               ACCESS_LOG='/dev/null')
+    seed(env, database)
+
+    port = free_port()
+    modes = commands(port, args.workers, args.threads)
+    base = f'http://127.0.0.1:{port}'
+    print(f'{args.clients} client(s) for {args.seconds:g}s per mode; production servers: '
+          f'{args.workers} worker(s){f" x {args.threads} thread(s)" if "gunicorn" in modes else ""}')
+    print(f"{'mode':<10}{'startup s':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    try:
+        for name, argv in modes.items():
+            if args.modes and name not in args.modes:
+                continue
+            started = time.perf_counter()
+            process = subprocess.Popen(argv, cwd=ROOT, env=env, start_new_session=True,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(base, process)
+                startup = time.perf_counter() - started
+                latencies, errors, elapsed = load(base, args.clients, args.seconds)
+            finally:
+                os.killpg(process.pid, signal.SIGTERM)
+                process.wait()
+            print(f'{name:<10}{startup:>10.2f}{len(latencies) / elapsed:>9.1f}{percentile(latencies, 50):>9.1f}'
+                  f'{percentile(latencies, 95):>9.1f}{percentile(latencies, 99):>9.1f}{errors:>8}')
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
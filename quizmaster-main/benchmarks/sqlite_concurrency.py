@@ -0,0 +1,97 @@
+"""Concurrent read/write throughput of the default vs the production SQLite profile.
+
+Usage (from quizmaster-main/):
+    python benchmarks/sqlite_concurrency.py [--readers 8] [--writers 4] [--seconds 5]
+
+Readers run the admin dashboard's counter and recent-attempts queries, writers
+insert one Score per transaction (one quiz submission each), all against a
+fresh database file per profile.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.exc import OperationalError
+from config import Config, ProductionConfig
+from database import db, sqlite_pragma_listener, User, Subject, Chapter, Quiz, Score
+
+def make_engine(path, profile):
+    engine = create_engine(f'sqlite:///{path}', **profile.SQLALCHEMY_ENGINE_OPTIONS)
+    if profile.SQLITE_PRAGMAS:
+        event.listen(engine, 'connect', sqlite_pragma_listener(profile.SQLITE_PRAGMAS))
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(User).values(id=1, username='bench', email='bench@example.com', password='x',
+                                         full_name='Bench User', dob=date(2000, 1, 1)))
+        conn.execute(insert(Subject).values(id=1, name='Subject'))
+        conn.execute(insert(Chapter).values(id=1, name='Chapter', subject_id=1))
+        conn.execute(insert(Quiz).values(id=1, title='Quiz', chapter_id=1, date_of_quiz=date.today(),
+                                         time_duration='00:10'))
+    return engine
+
+def run(profile, readers, writers, seconds):
+    counts = {'reads': 0, 'writes': 0, 'errors': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(os.path.join(tmp, 'bench.db'), profile)
+
+        def reader():
+            while not stop.is_set():
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(select(func.count(Score.id))).scalar()
+                        conn.execute(select(Score).order_by(Score.time_stamp_of_attempt.desc()).limit(10)).all()
+                    key = 'reads'
+                except OperationalError:
+                    key = 'errors'
+                with lock:
+                    counts[key] += 1
+
+        def writer():
+            while not stop.is_set():
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(Score).values(user_id=1, quiz_id=1, score=3, total_questions=5,
+                                                          percentage=60.0, time_stamp_of_attempt=datetime.utcnow()))
+                    key = 'writes'
+                except OperationalError:
+                    key = 'errors'
+                with lock:
+                    counts[key] += 1
+
+        threads = [threading.Thread(target=reader) for _ in range(readers)]
+        threads += [threading.Thread(target=writer) for _ in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        engine.dispose()
+
+    return {key: value / seconds for key, value in counts.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s per profile')
+    print(f"{'profile':<12}{'reads/s':>12}{'writes/s':>12}{'errors/s':>12}")
+    for name, profile in (('default', Config), ('production', ProductionConfig)):
+        result = run(profile, args.readers, args.writers, args.seconds)
+        print(f"{name:<12}{result['reads']:>12.0f}{result['writes']:>12.0f}{result['errors']:>12.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import event, inspect
+from database import db
+
+# In-process caches and commit-driven invalidation.
+
+_MISSING = object()
+
+# Named caches, reported by the admin cache-stats endpoint
+caches = {}
+
+class TTLCache:
+    """Small thread-safe cache with per-entry expiry and LRU eviction."""
+
+    def __init__(self, ttl=None, maxsize=1024, name=None):
+        if name:
+            caches[name] = self
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {'size': len(self._data), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
+
+
+# Commit hooks: after_flush records which rows of which models changed,
+# after_commit hands them to the registered callbacks. A rolled back
+# transaction never invalidates anything.
+
+_commit_callbacks = []
+
+def on_commit(*models):
+    """Run ``func(changes)`` after every commit that touched one of ``models``.
+
+    ``changes`` maps each changed model class to the set of primary keys
+    that were inserted, updated or deleted.
+    """
+    def decorator(func):
+        _commit_callbacks.append((models, func))
+        return func
+    return decorator
+
+def mark_changed(session, model, ids=()):
+    """Record changes made outside the ORM unit of work (bulk UPDATE/DELETE)."""
+    session.info.setdefault('changed_rows', {}).setdefault(model, set()).update(ids)
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        primary_key = inspect(obj).mapper.primary_key_from_instance(obj)
+        mark_changed(session, type(obj), primary_key[:1])
+
+@event.listens_for(db.session, 'after_commit')
+def _dispatch_changes(session):
+    changes = session.info.pop('changed_rows', None)
+    if not changes:
+        return
+    for models, func in _commit_callbacks:
+        if any(issubclass(changed, models) for changed in changes):
+            func(changes)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_changes(session, previous_transaction):
+    session.info.pop('changed_rows', None)
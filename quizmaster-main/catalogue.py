@@ -0,0 +1,84 @@
+import hashlib
+import json
+import threading
+from collections import namedtuple
+from flask import current_app
+from cache import TTLCache, on_commit
+from database import db, Subject, Chapter
+
+# In-memory snapshot of the subject -> chapter tree.
+#
+# The admin forms' subject and chapter dropdowns, the chapter picker and the
+# subject filters all read this snapshot instead of querying. It is loaded
+# with one query and rebuilt when the local revision moves (any commit that
+# touches a Subject or Chapter bumps it) or, for changes made by other
+# processes, after CATALOGUE_TTL seconds. Forms given an id the snapshot does
+# not know yet reload it on the spot (see forms.CatalogueChoices). The tree is also served as one JSON
+# document whose ETag is a hash of its content, so browsers revalidate it
+# with a 304 and every process hands out the same tag for the same tree.
+
+CatalogueSubject = namedtuple('CatalogueSubject', 'id name chapters')
+CatalogueChapter = namedtuple('CatalogueChapter', 'id name subject_id')
+
+class Snapshot:
+    def __init__(self, revision, rows):
+        self.revision = revision
+        subjects = {}
+        self.chapters = []
+        for subject_id, subject_name, chapter_id, chapter_name in rows:
+            subject = subjects.get(subject_id)
+            if subject is None:
+                subject = subjects[subject_id] = CatalogueSubject(subject_id, subject_name, [])
+            if chapter_id is not None:
+                chapter = CatalogueChapter(chapter_id, chapter_name, subject_id)
+                subject.chapters.append(chapter)
+                self.chapters.append(chapter)
+        self.subjects = list(subjects.values())
+        self._subjects = subjects
+        self._chapters = {chapter.id: chapter for chapter in self.chapters}
+
+        self.body = json.dumps({'subjects': [
+            {'id': subject.id, 'name': subject.name,
+             'chapters': [{'id': chapter.id, 'name': chapter.name} for chapter in subject.chapters]}
+            for subject in self.subjects
+        ]}, separators=(',', ':')).encode()
+        self.etag = hashlib.sha1(self.body).hexdigest()
+
+    def subject_choices(self):
+        return [(subject.id, subject.name) for subject in self.subjects]
+
+    def chapter_choices(self, subject_id=None):
+        """``(id, name)`` of the chapters of ``subject_id``, or of every chapter."""
+        if subject_id is None:
+            return [(chapter.id, chapter.name) for chapter in self.chapters]
+        subject = self._subjects.get(subject_id)
+        return [(chapter.id, chapter.name) for chapter in subject.chapters] if subject else []
+
+    def subject_of(self, chapter_id):
+        """Id of the subject ``chapter_id`` belongs to, or None."""
+        chapter = self._chapters.get(chapter_id)
+        return chapter.subject_id if chapter else None
+
+_snapshots = TTLCache(maxsize=1, name='catalogue')
+_revision = 0
+_lock = threading.Lock()
+
+def get_catalogue(refresh=False):
+    """The current Snapshot, reloaded after a local change, CATALOGUE_TTL seconds, or on ``refresh``."""
+    snapshot = _snapshots.get('catalogue')
+    if refresh or snapshot is None or snapshot.revision != _revision:
+        revision = _revision  # Read before loading, so a concurrent change forces another reload
+        rows = db.session.execute(
+            db.select(Subject.id, Subject.name, Chapter.id, Chapter.name)
+            .outerjoin(Chapter, Chapter.subject_id == Subject.id)
+            .order_by(Subject.id, Chapter.id)
+        ).all()
+        snapshot = Snapshot(revision, rows)
+        _snapshots.set('catalogue', snapshot, ttl=current_app.config['CATALOGUE_TTL'])
+    return snapshot
+
+@on_commit(Subject, Chapter)
+def _bump_revision(changes):
+    global _revision
+    with _lock:
+        _revision += 1
@@ -0,0 +1,171 @@
+from datetime import date
+import click
+from werkzeug.security import generate_password_hash
+from database import db, User, Chapter, Quiz, Question, Score, UserStats, Answer, LeaderboardEntry, QuizAttempt
+from identity import forget_user
+import importer
+from leaderboard import rebuild_leaderboards
+from queries import count_queries, explain_query_plan, is_full_scan
+from schema import init_db
+from search import init_search_index, reindex_quizzes
+from stats import rebuild_user_stats
+
+# Maximum number of SQL statements each admin page may issue, whatever the
+# size of the catalogue. Includes the query Flask-Login runs to load the user
+# (the identity cache is emptied before each page, to measure the worst case).
+QUERY_BUDGETS = {
+    '/admin/dashboard': 3,
+    '/admin/subjects': 3,
+    '/admin/chapters': 4,
+    '/admin/quizzes': 4,
+}
+
+def hot_queries():
+    """The per-request lookups that must be answered from an index, by name."""
+    return {
+        'latest attempt (quiz_results)': db.select(Score)
+            .where(Score.user_id == 1, Score.quiz_id == 1)
+            .order_by(Score.time_stamp_of_attempt.desc()).limit(1),
+        'recent attempts (user dashboard)': db.select(Score)
+            .where(Score.user_id == 1)
+            .order_by(Score.time_stamp_of_attempt.desc()).limit(5),
+        'recent attempts (admin dashboard)': db.select(Score.id)
+            .order_by(Score.time_stamp_of_attempt.desc()).limit(10),
+        'questions of a quiz (manage_questions)': db.select(Question)
+            .where(Question.quiz_id == 1).order_by(Question.id),
+        'quizzes of a chapter': db.select(Quiz).where(Quiz.chapter_id == 1),
+        'chapters of a subject (delete_subject)': db.select(Chapter).where(Chapter.subject_id == 1),
+        'answers of a quiz (analytics)': db.select(Answer.score_id, Answer.question_id, Answer.is_correct)
+            .where(Answer.quiz_id == 1),
+        'open attempt of a user (attempt_quiz)': db.select(QuizAttempt)
+            .where(QuizAttempt.user_id == 1, QuizAttempt.quiz_id == 1, QuizAttempt.submitted_at.is_(None)),
+    }
+
+def page_query_count(app, user, path):
+    """``(SQL statements issued, HTTP status)`` of rendering ``path`` as ``user``.
+
+    Runs outside any app context, so the request gets a fresh session and
+    Flask-Login has to load the user, exactly as in production.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user.get_id()
+        session['_fresh'] = True
+    forget_user(user.id)
+    with app.app_context(), count_queries() as statements:
+        response = client.get(path)
+    return len(statements), response.status_code
+
+def register_commands(app):
+    """Attach the project's CLI commands to ``app``."""
+
+    # Runs without the CLI's app context (see page_query_count); the same
+    # check runs on a seeded database in tests/test_query_budgets.py
+    @app.cli.command('check-query-budgets', with_appcontext=False)
+    def check_query_budgets():
+        """Render the admin list pages and fail if any goes over its query budget."""
+        with app.app_context():
+            admin = User.query.filter_by(is_admin=True).first()
+        if not admin:
+            raise click.ClickException('No admin user found to render the pages with.')
+
+        failures = 0
+        for path, budget in QUERY_BUDGETS.items():
+            used, status = page_query_count(app, admin, path)
+            ok = status == 200 and used <= budget
+            failures += not ok
+            click.echo(f"{'ok  ' if ok else 'FAIL'} {path}: {used}/{budget} queries (HTTP {status})")
+
+        if failures:
+            raise click.ClickException(f'{failures} page(s) over their query budget.')
+
+    @app.cli.command('init-db')
+    @click.option('--admin-email', envvar='ADMIN_EMAIL', required=True, help='[env: ADMIN_EMAIL]')
+    @click.option('--admin-password', envvar='ADMIN_PASSWORD',
+                  help='Only used when the admin user is created; asked for if not given.  [env: ADMIN_PASSWORD]')
+    def init_db_command(admin_email, admin_password):
+        """Create the database (or bring it up to date) and add the admin user if missing."""
+        init_db()
+        click.echo('Database schema is up to date.')
+        if User.query.filter_by(email=admin_email).first():
+            return
+        if not admin_password:
+            # Aborts when stdin is not a terminal, so no admin gets a guessable password
+            admin_password = click.prompt('Admin password', hide_input=True, confirmation_prompt=True)
+        db.session.add(User(
+            username='Tulika Kotiyal',
+            email=admin_email,
+            password=generate_password_hash(admin_password, app.config['PASSWORD_HASH_METHOD']),
+            full_name='Tulika Kotiyal',
+            qualification='System Administrator',
+            dob=date(2004, 7, 26),
+            is_admin=True,
+        ))
+        db.session.commit()
+        click.echo(f'Admin user {admin_email} created.')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Apply the pending schema migrations to an existing database."""
+        init_db()
+        click.echo('Database schema is up to date.')
+
+    @app.cli.command('check-indexes')
+    def check_indexes():
+        """EXPLAIN the hot lookups and fail if any of them scans a whole table."""
+        if db.engine.dialect.name != 'sqlite':
+            raise click.ClickException('check-indexes reads SQLite query plans only.')
+
+        failures = 0
+        for name, statement in hot_queries().items():
+            plan = explain_query_plan(statement)
+            scans = [detail for detail in plan if is_full_scan(detail)]
+            failures += bool(scans)
+            click.echo(f"{'FAIL' if scans else 'ok  '} {name}: {'; '.join(plan)}")
+
+        if failures:
+            raise click.ClickException(f'{failures} query(ies) not using an index; run `flask upgrade-db`.')
+
+    @app.cli.command('import-questions')
+    @click.argument('quiz_id', type=int)
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Default: from the file extension.')
+    def import_questions_command(quiz_id, path, fmt):
+        """Bulk-import questions into a quiz from a CSV or JSON-lines file."""
+        quiz = db.session.get(Quiz, quiz_id)
+        if quiz is None:
+            raise click.ClickException(f'Quiz {quiz_id} does not exist.')
+        try:
+            with open(path, 'rb') as stream:
+                result = importer.import_questions(quiz, stream, fmt or importer.detect_format(path))
+        except importer.ImportFileError as e:
+            raise click.ClickException(str(e))
+
+        for line, message in result.errors:
+            click.echo(f'line {line}: {message}', err=True)
+        if result.error_count > len(result.errors):
+            click.echo(f'... and {result.error_count - len(result.errors)} more invalid row(s)', err=True)
+        click.echo(f'Imported {result.imported} question(s), skipped {result.error_count} invalid row(s).')
+
+    @app.cli.command('backfill-user-stats')
+    def backfill_user_stats():
+        """Rebuild every user's score summary from the Score table."""
+        rebuild_user_stats(db.session.connection())
+        db.session.commit()
+        click.echo(f'Rebuilt score summaries for {UserStats.query.count()} user(s).')
+
+    @app.cli.command('rebuild-leaderboards')
+    def rebuild_leaderboards_command():
+        """Recompute every quiz and subject leaderboard from the Score table."""
+        rebuild_leaderboards(db.session.connection())
+        db.session.info['leaderboards_reset'] = True
+        db.session.commit()
+        click.echo(f'Rebuilt {LeaderboardEntry.query.count()} leaderboard entries.')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Rebuild the quiz full-text search index from the tables."""
+        init_search_index()
+        reindex_quizzes(db.session.connection())
+        db.session.commit()
+        click.echo('Search index rebuilt.')
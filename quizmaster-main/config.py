@@ -9,9 +9,136 @@ class Config:
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///quiz_master.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+    # PRAGMAs run on every new SQLite connection (see database.init_engine)
+    SQLITE_PRAGMAS = {}
+
+    # Seconds the admin dashboard statistics are cached for
+    DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', 30))
+
+    # Password hashing (see passwords.py): a pool of PASSWORD_HASH_WORKERS
+    # processes (0 = hash on the request thread) with at most
+    # PASSWORD_HASH_MAX_PENDING hashes queued. Stored hashes made with other
+    # parameters than PASSWORD_HASH_METHOD are upgraded at the next login.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 32))
+    PASSWORD_HASH_TIMEOUT = 10
+
+    # Login attempts allowed per (limit, window in seconds): every attempt
+    # counts per email, only failed ones per client address. Behind reverse
+    # proxies, set PROXY_FIX_HOPS to their number so that the client address
+    # is read from X-Forwarded-For (otherwise every client has the proxy's).
+    LOGIN_RATE_LIMITS = {
+        'ip': (int(os.environ.get('LOGIN_RATE_PER_IP', 30)), 60),
+        'email': (int(os.environ.get('LOGIN_RATE_PER_EMAIL', 5)), 60),
+    }
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', 0))
+
+    # Logged-in users are loaded from an in-process cache (see identity.py).
+    # Commits invalidate it in this process only, so with several worker
+    # processes a change can take up to USER_CACHE_TTL seconds to show up.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 5))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 4096))
+
+    # Seconds the subject/chapter catalogue is reused before being reloaded,
+    # to pick up changes made by other processes (see catalogue.py)
+    CATALOGUE_TTL = int(os.environ.get('CATALOGUE_TTL', 60))
+
+    # Seconds quiz analytics are reused before new attempts are taken into
+    # account (an edit to the quiz recomputes them at once; see analytics.py)
+    ANALYTICS_TTL = int(os.environ.get('ANALYTICS_TTL', 300))
+
+    # Seconds an in-memory leaderboard is served before being reloaded, to
+    # pick up scores written by other processes (see leaderboard.py)
+    LEADERBOARD_TTL = int(os.environ.get('LEADERBOARD_TTL', 60))
+    LEADERBOARD_MAX_LIMIT = 100
+
+    # Quiz search: 'fts5' (SQLite full-text index) or 'like' (plain ILIKE filters)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'fts5')
+
+    # Listing pagination: default/maximum page size, and how many numbered
+    # (OFFSET) pages to offer before switching to keyset "Next" links
+    PER_PAGE = 20
+    MAX_PER_PAGE = 100
+    MAX_OFFSET_PAGES = 10
+
+    # Request instrumentation (see metrics.py), off unless METRICS_ENABLED=1:
+    # the share of requests measured, and cProfile dumps (to PROFILE_DIR,
+    # default <instance>/profiles) of profiled requests slower than
+    # PROFILE_SLOW_REQUESTS_MS (0 = never profile)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
+    PROFILE_SLOW_REQUESTS_MS = int(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+
+    # Timed attempts (see attempts.py): seconds a submission may arrive after
+    # the deadline, and how often autosaved answers are written (0 = at once)
+    QUIZ_DEADLINE_GRACE = int(os.environ.get('QUIZ_DEADLINE_GRACE', 10))
+    AUTOSAVE_FLUSH_INTERVAL = float(os.environ.get('AUTOSAVE_FLUSH_INTERVAL', 5))
+
+    # Questions per page of the JSON API (see api.py)
+    API_QUESTIONS_PER_PAGE = 50
+
+    # Write-behind score ingestion (see ingest.py). Submissions are journaled
+    # to SCORE_JOURNAL_DIR (default: <instance>/score_journal) and committed in
+    # batches of up to SCORE_BATCH_SIZE at most SCORE_FLUSH_INTERVAL seconds apart.
+    # A score that fails to be written SCORE_MAX_ATTEMPTS times for a reason
+    # other than a busy database is set aside in <journal dir>/dead-letter.jsonl.
+    SCORE_WRITE_BEHIND = os.environ.get('SCORE_WRITE_BEHIND', '1') == '1'
+    SCORE_FLUSH_INTERVAL = float(os.environ.get('SCORE_FLUSH_INTERVAL', 0.5))
+    SCORE_BATCH_SIZE = int(os.environ.get('SCORE_BATCH_SIZE', 200))
+    SCORE_JOURNAL_DIR = os.environ.get('SCORE_JOURNAL_DIR')
+    SCORE_JOURNAL_FSYNC = True
+    SCORE_MAX_ATTEMPTS = int(os.environ.get('SCORE_MAX_ATTEMPTS', 3))
+
+    # Bulk question import/export (see importer.py and exports.py): rows per
+    # executemany INSERT, and rows fetched per round trip while exporting
+    IMPORT_CHUNK_SIZE = 500
+    EXPORT_BATCH_SIZE = 1000
+
+    # Quizzes deleted per transaction when a subject, chapter or quiz is
+    # removed (see deletion.py); 0 deletes everything in one transaction
+    BULK_DELETE_CHUNK = int(os.environ.get('BULK_DELETE_CHUNK', 0))
+
+    # Background jobs (see jobs.py): worker threads per process (0 = run each
+    # job inline, in the request that starts it), and how often a running
+    # job's progress is written to the job table, in seconds
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_PROGRESS_INTERVAL = float(os.environ.get('JOB_PROGRESS_INTERVAL', 1))
 
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_SECURE = os.environ.get('FLASK_ENV') == 'production'
     SESSION_COOKIE_HTTPONLY = True
-    SESSION_COOKIE_SAMESITE = 'Lax'
\ No newline at end of file
+    SESSION_COOKIE_SAMESITE = 'Lax'
+
+class ProductionConfig(Config):
+    # SQLite: WAL lets readers run alongside the single writer, NORMAL sync is
+    # safe under WAL, and writers wait for the lock instead of failing at once
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': -int(os.environ.get('SQLITE_CACHE_KB', 64 * 1024)),  # negative = KiB
+        'temp_store': 'MEMORY',
+    }
+
+    # Connection pool for server databases (PostgreSQL etc. via DATABASE_URL)
+    if not Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+        }
+
+# Selected with FLASK_ENV (see main.py)
+config_by_name = {
+    'development': Config,
+    'production': ProductionConfig,
+}
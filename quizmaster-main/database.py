@@ -1,9 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+import hashlib
 from flask_login import UserMixin
+from sqlalchemy import event
 
 db = SQLAlchemy()
 
+def sqlite_pragma_listener(pragmas):
+    """Engine 'connect' listener that runs ``PRAGMA name = value`` for each item."""
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+    return set_pragmas
+
+def init_engine(app):
+    """Apply the configured SQLite PRAGMAs to every connection of the app's engine."""
+    pragmas = app.config['SQLITE_PRAGMAS']
+    with app.app_context():
+        engine = db.engine
+    if pragmas and engine.dialect.name == 'sqlite':
+        event.listen(engine, 'connect', sqlite_pragma_listener(pragmas))
+
+def credentials_fingerprint(password, is_admin):
+    """Short digest of a user's password hash and admin flag (see User.get_id)."""
+    return hashlib.sha256(f'{password}:{bool(is_admin)}'.encode()).hexdigest()[:16]
+
 # User Model
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,6 +38,7 @@ class User(db.Model, UserMixin):
     dob = db.Column(db.Date, nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
     scores = db.relationship('Score', backref='user', lazy=True)
+    stats = db.relationship('UserStats', uselist=False, lazy=True, cascade="all, delete-orphan")
 
     # Flask-Login required properties and methods
     @property
@@ -30,7 +54,9 @@ class User(db.Model, UserMixin):
         return False  # Regular users are not anonymous
 
     def get_id(self):
-        return str(self.id)  # Return the user's ID as a string
+        # Stored in the session: the id plus a fingerprint of the credentials,
+        # so a session ends once the password or admin flag changes (identity.py)
+        return f'{self.id}:{credentials_fingerprint(self.password, self.is_admin)}'
 
 # Subject Model
 class Subject(db.Model):
@@ -44,19 +70,23 @@ class Chapter(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     description = db.Column(db.String(500))
-    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False)
+    subject_id = db.Column(db.Integer, db.ForeignKey('subject.id'), nullable=False, index=True)
     quizzes = db.relationship('Quiz', backref='chapter', lazy=True, cascade="all, delete-orphan")
 
 # Quiz Model
 class Quiz(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
-    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapter.id'), nullable=False, index=True)
     date_of_quiz = db.Column(db.Date, nullable=False)
     time_duration = db.Column(db.String(5), nullable=False)  # HH:MM format
     remarks = db.Column(db.String(500))
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')  # Bumped on every content change
+    pool_size = db.Column(db.Integer)  # Questions drawn per attempt; None = all of them (see pools.py)
+    pool_strata = db.Column(db.String(10))  # Draw proportionally per 'tag' or 'difficulty'; None = from the whole pool
     questions = db.relationship('Question', backref='quiz', lazy=True, cascade="all, delete-orphan")
     scores = db.relationship('Score', backref='quiz', cascade="all, delete-orphan", lazy=True)
+    attempts = db.relationship('QuizAttempt', backref='quiz', cascade="all, delete-orphan", lazy=True)
 
 # Question Model
 
@@ -68,16 +98,108 @@ class Question(db.Model):
     option3 = db.Column(db.String(200), nullable=True)         # Option 3 (optional)
     option4 = db.Column(db.String(200), nullable=True)         # Option 4 (optional)
     correct_option = db.Column(db.Integer, nullable=False)     # Correct option (1, 2, 3, or 4)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)  # Foreign key to Quiz
+    tag = db.Column(db.String(50))                             # Optional topic, for stratified pools
+    difficulty = db.Column(db.String(10))                      # Optional 'easy', 'medium' or 'hard'
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)  # Foreign key to Quiz
+    answers = db.relationship('Answer', backref='question', lazy=True, cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Question {self.id}>'
 # Score Model
 class Score(db.Model):
+    __table_args__ = (
+        # Latest attempt of a user at a quiz (quiz_results); also serves user_id lookups
+        db.Index('ix_score_user_quiz_time', 'user_id', 'quiz_id', 'time_stamp_of_attempt'),
+        # A user's most recent attempts (user dashboard)
+        db.Index('ix_score_user_time', 'user_id', 'time_stamp_of_attempt'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
     score = db.Column(db.Integer, nullable=False)
     total_questions = db.Column(db.Integer, nullable=False)
     percentage = db.Column(db.Float, nullable=False)
-    time_stamp_of_attempt = db.Column(db.DateTime, default=datetime.utcnow)
\ No newline at end of file
+    time_stamp_of_attempt = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Admin dashboard's recent attempts
+    submission_id = db.Column(db.String(32), unique=True, index=True)  # Set by ingest.ScoreIngestor
+    answers = db.relationship('Answer', backref='score', lazy=True, cascade="all, delete-orphan")
+
+# Answer Model: the option a user picked for one question of an attempt (see analytics.py)
+class Answer(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    score_id = db.Column(db.Integer, db.ForeignKey('score.id'), nullable=False, index=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)  # Lets analytics load a quiz in one range scan
+    question_id = db.Column(db.Integer, db.ForeignKey('question.id'), nullable=False, index=True)
+    selected_option = db.Column(db.Integer)  # None if left unanswered
+    is_correct = db.Column(db.Boolean, nullable=False)  # Graded at submission time
+
+# QuizAttempt Model: a quiz being taken, from its start to its submission (see attempts.py)
+class QuizAttempt(db.Model):
+    __table_args__ = (
+        # The open attempt of a user at a quiz
+        db.Index('ix_quiz_attempt_user_quiz', 'user_id', 'quiz_id', 'submitted_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    revision = db.Column(db.Integer, nullable=False)  # Quiz.revision the answers refer to
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    deadline = db.Column(db.DateTime)  # None if the quiz has no duration
+    seed = db.Column(db.Integer)  # Seed of the question draw, for quizzes with a pool
+    question_ids = db.Column(db.Text, nullable=False, default='')  # Drawn ids, comma-separated; '' = every question in id order
+    answers = db.Column(db.Text, nullable=False, default='')  # One digit per question in attempt order, 0 = unanswered
+    saved_at = db.Column(db.DateTime)
+    submitted_at = db.Column(db.DateTime)
+
+# Job Model: a heavy admin operation run in the background, with its progress (see jobs.py)
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)  # Name of the handler in jobs.py
+    params = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments of the handler
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Units of work done...
+    total = db.Column(db.Integer)  # ...out of total, once known
+    result = db.Column(db.Text)  # JSON returned by the handler
+    error = db.Column(db.Text)
+    owner = db.Column(db.String(80))  # host:pid of the process that queued or runs it
+    created_by = db.Column(db.Integer)  # User.id of the admin who started it
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+# Bump Quiz.revision whenever a quiz or one of its questions changes, so caches
+# keyed by (quiz id, revision) never serve stale content.
+@event.listens_for(db.session, 'before_flush')
+def bump_quiz_revisions(session, flush_context, instances):
+    quizzes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Question):
+            quiz = obj.quiz or (obj.quiz_id and session.get(Quiz, obj.quiz_id))
+            if quiz:
+                quizzes.add(quiz)
+        elif isinstance(obj, Quiz) and obj in session.dirty and session.is_modified(obj, include_collections=False):
+            quizzes.add(obj)
+    for quiz in quizzes:
+        if quiz not in session.new and quiz not in session.deleted:
+            quiz.revision = Quiz.revision + 1
+
+# Per-user score summary, kept in step with Score by stats.record_attempt
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    attempt_count = db.Column(db.Integer, nullable=False, default=0)
+    percentage_sum = db.Column(db.Float, nullable=False, default=0)
+    best_percentage = db.Column(db.Float, nullable=False, default=0)
+    last_attempt_at = db.Column(db.DateTime)
+
+    @property
+    def average_percentage(self):
+        return self.percentage_sum / self.attempt_count if self.attempt_count else 0
+
+# Leaderboard standings, kept up to date by leaderboard.record_score
+class LeaderboardEntry(db.Model):
+    board = db.Column(db.String(10), primary_key=True)  # 'quiz' or 'subject'
+    board_id = db.Column(db.Integer, primary_key=True)  # Quiz.id or Subject.id
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True, index=True)
+    points = db.Column(db.Float, nullable=False)  # Best percentage (quiz) or sum of the quiz bests (subject)
+    achieved_at = db.Column(db.DateTime)  # When the points were reached; earlier ranks higher on ties
@@ -0,0 +1,111 @@
+from flask import current_app
+from sqlalchemy import delete, select
+from cache import mark_changed
+from database import db, User, Subject, Chapter, Quiz, Question, Score, Answer, QuizAttempt, UserStats
+from ingest import score_ingestor
+import leaderboard
+from search import remove_quizzes
+from stats import rebuild_user_stats
+
+# Set-based deletes of subjects, chapters, quizzes and users.
+#
+# The ORM cascades (cascade="all, delete-orphan") load every dependent row
+# into the session and delete them one at a time. Here each table is emptied
+# bottom-up with a single DELETE ... WHERE ... IN per table. What the ORM
+# hooks would have kept in step is fixed in the same transaction: search
+# index rows, and the UserStats and leaderboard entries of users who lost
+# scores. The deleted rows are reported with mark_changed, so the commit hooks
+# drop the same caches as after an ORM delete. Scores still queued in the
+# write-behind ingestor for the deleted quizzes or user are discarded too.
+#
+# With BULK_DELETE_CHUNK set, quizzes are deleted that many at a time, each
+# batch in its own transaction, so the write lock is released between
+# batches. Every batch removes whole quizzes, so the database is consistent
+# after each one. An optional ``progress(done, total)`` callback is told how
+# many quizzes are gone after each committed batch (see jobs.py).
+
+def _execute(session, statement):
+    session.execute(statement.execution_options(synchronize_session=False))
+
+def _delete_quiz_batch(session, quiz_ids):
+    """Delete ``quiz_ids`` and everything under them, in the current transaction."""
+    user_ids = set(session.execute(
+        select(Score.user_id).where(Score.quiz_id.in_(quiz_ids)).distinct()).scalars())
+    _execute(session, delete(Answer).where(Answer.quiz_id.in_(quiz_ids)))
+    _execute(session, delete(QuizAttempt).where(QuizAttempt.quiz_id.in_(quiz_ids)))
+    _execute(session, delete(Score).where(Score.quiz_id.in_(quiz_ids)))
+    _execute(session, delete(Question).where(Question.quiz_id.in_(quiz_ids)))
+    _execute(session, delete(Quiz).where(Quiz.id.in_(quiz_ids)))
+
+    remove_quizzes(session.connection(), quiz_ids)
+    if user_ids:
+        rebuild_user_stats(session.connection(), user_ids)
+        leaderboard.refresh_users(session, user_ids)
+        mark_changed(session, Score)
+    mark_changed(session, Quiz, quiz_ids)
+
+def _delete_quizzes(session, quiz_ids, progress=None):
+    """Delete ``quiz_ids`` in batches; the last batch is left uncommitted."""
+    quiz_ids = sorted(quiz_ids)
+    chunk = current_app.config['BULK_DELETE_CHUNK'] or len(quiz_ids) or 1
+    for start in range(0, len(quiz_ids), chunk):
+        if start:
+            session.commit()
+            if progress:
+                progress(start, len(quiz_ids))
+        _delete_quiz_batch(session, quiz_ids[start:start + chunk])
+
+def _run(work):
+    try:
+        work(db.session)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+def delete_quizzes(quiz_ids, progress=None):
+    """Delete quizzes with their questions, scores, answers and attempts, and commit."""
+    _run(lambda session: _delete_quizzes(session, quiz_ids, progress))
+    score_ingestor.discard(quiz_ids=quiz_ids)
+
+def delete_chapters(chapter_ids, progress=None):
+    """Delete chapters and all their quizzes, and commit."""
+    quiz_ids = []
+    def work(session):
+        quiz_ids[:] = session.execute(select(Quiz.id).where(Quiz.chapter_id.in_(chapter_ids))).scalars()
+        _delete_quizzes(session, quiz_ids, progress)
+        _execute(session, delete(Chapter).where(Chapter.id.in_(chapter_ids)))
+        mark_changed(session, Chapter, chapter_ids)
+    _run(work)
+    score_ingestor.discard(quiz_ids=quiz_ids)
+
+def delete_subjects(subject_ids, progress=None):
+    """Delete subjects with their chapters and quizzes, and commit."""
+    quiz_ids = []
+    def work(session):
+        quiz_ids[:] = session.execute(
+            select(Quiz.id).join(Chapter, Quiz.chapter_id == Chapter.id)
+            .where(Chapter.subject_id.in_(subject_ids))).scalars()
+        _delete_quizzes(session, quiz_ids, progress)
+        chapter_ids = session.execute(select(Chapter.id).where(Chapter.subject_id.in_(subject_ids))).scalars().all()
+        _execute(session, delete(Chapter).where(Chapter.id.in_(chapter_ids)))
+        _execute(session, delete(Subject).where(Subject.id.in_(subject_ids)))
+        mark_changed(session, Chapter, chapter_ids)
+        mark_changed(session, Subject, subject_ids)
+    _run(work)
+    score_ingestor.discard(quiz_ids=quiz_ids)
+
+def delete_user(user_id):
+    """Delete a user with their scores, answers, attempts and standings, and commit."""
+    def work(session):
+        scores = select(Score.id).where(Score.user_id == user_id)
+        _execute(session, delete(Answer).where(Answer.score_id.in_(scores)))
+        _execute(session, delete(Score).where(Score.user_id == user_id))
+        _execute(session, delete(QuizAttempt).where(QuizAttempt.user_id == user_id))
+        _execute(session, delete(UserStats).where(UserStats.user_id == user_id))
+        leaderboard.remove_user(session, user_id)
+        _execute(session, delete(User).where(User.id == user_id))
+        mark_changed(session, Score)
+        mark_changed(session, User, [user_id])
+    _run(work)
+    score_ingestor.discard(user_id=user_id)
@@ -0,0 +1,154 @@
+import csv
+import io
+import json
+import zlib
+from flask import current_app
+from database import db, User, Subject, Chapter, Quiz, Question, Score
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# Streaming exports: a quiz's questions, and quiz attempts (results).
+#
+# Rows are fetched from a server-side cursor EXPORT_BATCH_SIZE at a time
+# (yield_per) and encoded batch by batch, so memory stays flat however many
+# rows are exported. Text formats can additionally be gzip-compressed on the
+# fly; Parquet (when pyarrow is installed) writes one row group per batch.
+# The question columns match what importer.py reads back.
+
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson', 'parquet': 'application/vnd.apache.parquet'}
+
+QUESTION_COLUMNS = ('id', 'question_text', 'option1', 'option2', 'option3', 'option4', 'correct_option',
+                    'tag', 'difficulty')
+RESULT_COLUMNS = ('score_id', 'user_id', 'username', 'full_name', 'subject_id', 'subject', 'chapter_id',
+                  'chapter', 'quiz_id', 'quiz', 'score', 'total_questions', 'percentage', 'time_stamp_of_attempt')
+
+def available_formats():
+    return [fmt for fmt in EXPORT_FORMATS if fmt != 'parquet' or pa is not None]
+
+def _batches(statement):
+    """Lists of rows of ``statement``, streamed EXPORT_BATCH_SIZE at a time."""
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    result = db.session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield partition
+
+def _text_chunks(batches, columns, fmt):
+    """Encode row batches as CSV or JSON-lines, one string per batch."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(columns)
+
+    for batch in batches:
+        for row in batch:
+            if writer:
+                writer.writerow(row)
+            else:
+                record = {name: value.isoformat() if hasattr(value, 'isoformat') else value
+                          for name, value in zip(columns, row)}
+                buffer.write(json.dumps(record) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # CSV header of an empty export
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written so far with ``drain()``."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def _parquet_chunks(batches, schema):
+    """Encode row batches as one Parquet file, yielding bytes as row groups are written."""
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            yield sink.drain()
+    yield sink.drain()
+
+def gzip_chunks(chunks):
+    """Compress a stream of str/bytes chunks into a gzip stream."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_questions(quiz_id, fmt):
+    statement = (
+        db.select(*(getattr(Question, name) for name in QUESTION_COLUMNS))
+        .where(Question.quiz_id == quiz_id)
+        .order_by(Question.id)
+    )
+    return _text_chunks(_batches(statement), QUESTION_COLUMNS, fmt)
+
+def results_statement(subject_id=None, chapter_id=None, quiz_id=None, date_from=None, date_to=None):
+    """Every attempt with its user, quiz, chapter and subject, optionally filtered.
+
+    ``date_from`` and ``date_to`` are datetimes; ``date_to`` is exclusive.
+    """
+    statement = (
+        db.select(Score.id, User.id, User.username, User.full_name, Subject.id, Subject.name,
+                  Chapter.id, Chapter.name, Quiz.id, Quiz.title, Score.score, Score.total_questions,
+                  Score.percentage, Score.time_stamp_of_attempt)
+        .join(User, Score.user_id == User.id)
+        .join(Quiz, Score.quiz_id == Quiz.id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+        .join(Subject, Chapter.subject_id == Subject.id)
+        .order_by(Score.id)
+    )
+    if subject_id is not None:
+        statement = statement.where(Chapter.subject_id == subject_id)
+    if chapter_id is not None:
+        statement = statement.where(Quiz.chapter_id == chapter_id)
+    if quiz_id is not None:
+        statement = statement.where(Score.quiz_id == quiz_id)
+    if date_from is not None:
+        statement = statement.where(Score.time_stamp_of_attempt >= date_from)
+    if date_to is not None:
+        statement = statement.where(Score.time_stamp_of_attempt < date_to)
+    return statement
+
+def _result_schema():
+    return pa.schema([
+        ('score_id', pa.int64()), ('user_id', pa.int64()), ('username', pa.string()),
+        ('full_name', pa.string()), ('subject_id', pa.int64()), ('subject', pa.string()),
+        ('chapter_id', pa.int64()), ('chapter', pa.string()), ('quiz_id', pa.int64()),
+        ('quiz', pa.string()), ('score', pa.int32()), ('total_questions', pa.int32()),
+        ('percentage', pa.float64()), ('time_stamp_of_attempt', pa.timestamp('us')),
+    ])
+
+def export_results(fmt, **filters):
+    """Chunks of the results export in ``fmt``; ``filters`` as for results_statement."""
+    batches = _batches(results_statement(**filters))
+    if fmt == 'parquet':
+        return _parquet_chunks(batches, _result_schema())
+    return _text_chunks(batches, RESULT_COLUMNS, fmt)
@@ -1,11 +1,14 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import (
     StringField, PasswordField, DateField, TextAreaField, 
     SubmitField, SelectField, IntegerField, RadioField
 )
-from wtforms.validators import DataRequired, Email, Length, ValidationError, EqualTo, Regexp
+from wtforms.validators import DataRequired, Email, Length, ValidationError, EqualTo, Regexp, Optional, NumberRange
 from datetime import datetime
 from database import User
+from catalogue import get_catalogue
+from pools import DIFFICULTIES
 
 # User Login Form
 class LoginForm(FlaskForm):
@@ -35,7 +38,33 @@ class RegistrationForm(FlaskForm):
         if User.query.filter_by(username=username.data).first():
             raise ValidationError("This username is already taken. Please choose a different one.")
 
-        
+
+class CatalogueChoices:
+    """Fills the subject (and chapter) dropdowns from the in-memory catalogue.
+
+    The snapshot can predate a subject or chapter another process just
+    created, so a submitted id it does not know reloads it once before the
+    choice is rejected.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._set_choices(get_catalogue())  # In memory, see catalogue.py
+
+    def _catalogue_fields(self):
+        return [field for field in (self._fields.get('subject_id'), self._fields.get('chapter_id')) if field]
+
+    def _set_choices(self, catalogue):
+        self.subject_id.choices = catalogue.subject_choices()
+        if 'chapter_id' in self._fields:
+            self.chapter_id.choices = catalogue.chapter_choices()
+
+    def validate(self, extra_validators=None):
+        if any(field.data is not None and field.data not in dict(field.choices)
+               for field in self._catalogue_fields()):
+            self._set_choices(get_catalogue(refresh=True))
+        return super().validate(extra_validators)
+
 # Subject Management Form
 class SubjectForm(FlaskForm):
     name = StringField("Subject Name", validators=[DataRequired()])
@@ -43,14 +72,14 @@ class SubjectForm(FlaskForm):
     submit = SubmitField("Save")
 
 # Chapter Management Form
-class ChapterForm(FlaskForm):
+class ChapterForm(CatalogueChoices, FlaskForm):
     name = StringField("Chapter Name", validators=[DataRequired()])
     description = TextAreaField("Description")
     subject_id = SelectField("Select Subject", coerce=int, validators=[DataRequired()])
     submit = SubmitField("Save")
 
 # Quiz Creation Form
-class QuizForm(FlaskForm):
+class QuizForm(CatalogueChoices, FlaskForm):
     title = StringField("Quiz Title", validators=[DataRequired()])
     subject_id = SelectField("Select Subject", coerce=int, validators=[DataRequired()])  # Add this field
     chapter_id = SelectField("Select Chapter", coerce=int, validators=[DataRequired()])
@@ -63,8 +92,17 @@ class QuizForm(FlaskForm):
         ]
     )
     remarks = TextAreaField("Remarks")
+    # Question pool (see pools.py): draw this many questions per attempt
+    pool_size = IntegerField("Questions per Attempt", validators=[Optional(), NumberRange(min=1)])
+    pool_strata = SelectField("Draw", choices=[
+        ('', "From the whole pool"), ('tag', "Proportionally by tag"), ('difficulty', "Proportionally by difficulty")
+    ])
     submit = SubmitField("Save")
 
+    def validate_chapter_id(self, chapter_id):
+        if self.subject_id.data and get_catalogue().subject_of(chapter_id.data) != self.subject_id.data:
+            raise ValidationError("The chapter does not belong to the selected subject.")
+
     def validate_date_of_quiz(self, date_of_quiz):
         if date_of_quiz.data < datetime.today().date():
             raise ValidationError("Quiz date must be today or a future date.")
@@ -82,4 +120,14 @@ class QuestionForm(FlaskForm):
         coerce=int, 
         validators=[DataRequired()]
     )
+    tag = StringField("Tag", validators=[Optional(), Length(max=50)])
+    difficulty = SelectField("Difficulty", choices=[('', "Not set")] + [(level, level.title()) for level in DIFFICULTIES])
     submit = SubmitField("Save")
+
+# Bulk Question Import Form (see importer.py for the file layout)
+class QuestionImportForm(FlaskForm):
+    file = FileField("Questions file (.csv or .jsonl)", validators=[
+        FileRequired(),
+        FileAllowed(['csv', 'jsonl', 'ndjson'], "Upload a .csv or .jsonl file.")
+    ])
+    submit = SubmitField("Import")
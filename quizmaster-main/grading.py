@@ -0,0 +1,79 @@
+from array import array
+from cache import TTLCache, on_commit
+from database import db, Quiz, Question
+
+# Answer keys for grading, cached in memory per quiz revision.
+#
+# A key is two parallel compact arrays: question ids (in question order) and
+# their correct options. Grading a submission is then a pure in-memory
+# comparison; the database is only asked again after Quiz.revision changes.
+# Attempts at quizzes with a question pool are graded with a subset of the
+# key holding just the drawn questions (see pools.py).
+
+_answer_keys = TTLCache(maxsize=2048, name='answer_keys')
+
+class AnswerKey:
+    __slots__ = ('revision', 'question_ids', 'correct_options', '_positions')
+
+    def __init__(self, revision, rows):
+        self.revision = revision
+        self.question_ids = array('l', (row[0] for row in rows))
+        self.correct_options = array('b', (row[1] for row in rows))
+        self._positions = None  # question id -> index, built on the first subset()
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def subset(self, question_ids):
+        """AnswerKey of just ``question_ids``, in that order; ids not in this key are skipped."""
+        if self._positions is None:
+            self._positions = {question_id: i for i, question_id in enumerate(self.question_ids)}
+        positions = self._positions
+        return AnswerKey(self.revision, [(question_id, self.correct_options[positions[question_id]])
+                                         for question_id in question_ids if question_id in positions])
+
+    def selected_options(self, answers):
+        """The option picked for each question, in key order (0 = unanswered)."""
+        selected = array('b')
+        for question_id in self.question_ids:
+            choice = answers.get(f'question_{question_id}', '')
+            selected.append(int(choice) if choice in ('1', '2', '3', '4') else 0)
+        return selected
+
+    def selected_from_list(self, options):
+        """Like selected_options, from one option per question in key order (0 or None = unanswered)."""
+        if len(options) != len(self.question_ids):
+            raise ValueError(f'Expected {len(self.question_ids)} answers, got {len(options)}.')
+        if any(option is not None and (type(option) is not int or not 0 <= option <= 4) for option in options):
+            raise ValueError('Each answer must be an option number from 1 to 4, or 0 if unanswered.')
+        return array('b', (option or 0 for option in options))
+
+    def count_correct(self, selected):
+        return sum(1 for chosen, correct in zip(selected, self.correct_options) if chosen == correct)
+
+    def grade(self, answers):
+        """Count correct answers; ``answers`` maps ``question_<id>`` to the chosen option."""
+        return self.count_correct(self.selected_options(answers))
+
+    def answer_rows(self, selected):
+        """``[question_id, option or None, is_correct]`` per question, as stored in Answer."""
+        return [[question_id, chosen or None, chosen == correct]
+                for question_id, chosen, correct in zip(self.question_ids, selected, self.correct_options)]
+
+def get_answer_key(quiz):
+    """Return the AnswerKey of ``quiz``, loading it only if its revision changed."""
+    key = _answer_keys.get(quiz.id)
+    if key is None or key.revision != quiz.revision:
+        rows = db.session.execute(
+            db.select(Question.id, Question.correct_option)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.id)
+        ).all()
+        key = AnswerKey(quiz.revision, rows)
+        _answer_keys.set(quiz.id, key)
+    return key
+
+@on_commit(Quiz)
+def _drop_answer_keys(changes):
+    for quiz_id in changes.get(Quiz, ()):
+        _answer_keys.pop(quiz_id)
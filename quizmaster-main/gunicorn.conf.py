@@ -0,0 +1,36 @@
+import multiprocessing
+import os
+
+# Production server settings: gunicorn -c gunicorn.conf.py wsgi:app
+#
+# gthread workers: each worker process serves WEB_THREADS requests at once
+# from a thread pool. Requests mostly wait on SQLite, the password hasher
+# pool and the network, so threads overlap them well; processes add CPU.
+#
+# Every worker imports wsgi.py and creates its own app after the fork, so it
+# runs its own score ingestor, autosave flusher and job workers (the
+# background threads of the app do not survive a fork, hence no preload_app).
+# Run `flask --app main init-db --admin-email ...` once before the first start.
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+preload_app = False
+
+if workers > 1 and not os.environ.get('SECRET_KEY'):
+    # Each worker would sign sessions with its own random key (see config.py)
+    raise RuntimeError('Set SECRET_KEY to run more than one worker.')
+
+# Longer than the slowest export streamed inline; bulk jobs run in the background
+timeout = int(os.environ.get('WEB_TIMEOUT', 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then, staggered, to bound slow memory growth
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = os.environ.get('ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info')
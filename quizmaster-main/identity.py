@@ -0,0 +1,68 @@
+from flask import current_app
+from flask_login import UserMixin
+from cache import TTLCache, on_commit
+from database import db, User
+
+# Flask-Login user loading without a query per request.
+#
+# load_user keeps an immutable snapshot of the fields requests read from
+# current_user (id, names, email, admin flag), keyed by user id. Any
+# committed change to a User row, including delete_user and admin status
+# changes, drops that user's snapshot so the next request reloads it.
+#
+# That only reaches the process that made the change. Other workers notice
+# within USER_CACHE_TTL (a few seconds), and the session id carries a
+# fingerprint of the password hash and admin flag (User.get_id): a session
+# whose fingerprint no longer matches the user is logged out. A snapshot
+# that does not match the session is reloaded once first, since the session
+# may be newer than this worker's copy.
+
+_users = TTLCache(name='users')
+
+class CachedUser(UserMixin):
+    """Detached, read-only view of a User, safe to share between requests."""
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.full_name = user.full_name
+        self.is_admin = bool(user.is_admin)
+        self._id = user.get_id()
+
+    def __repr__(self):
+        return f'<CachedUser {self.id}>'
+
+    def get_id(self):
+        return self._id
+
+def _load(user_id):
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = CachedUser(user)
+    _users.set(user_id, snapshot, ttl=current_app.config['USER_CACHE_TTL'])
+    return snapshot
+
+def load_user(session_id):
+    """Flask-Login user_loader: the user whose ``User.get_id()`` is ``session_id``, or None."""
+    try:
+        user_id = int(session_id.partition(':')[0])
+    except (AttributeError, ValueError):
+        return None
+    snapshot = _users.get(user_id)
+    if snapshot is None or snapshot.get_id() != session_id:
+        snapshot = _load(user_id)
+    return snapshot if snapshot is not None and snapshot.get_id() == session_id else None
+
+def init_app(app, login_manager):
+    _users.maxsize = app.config['USER_CACHE_SIZE']
+    login_manager.user_loader(load_user)
+
+def forget_user(user_id):
+    _users.pop(user_id)
+
+@on_commit(User)
+def _drop_changed_users(changes):
+    for user_id in changes.get(User, ()):
+        forget_user(user_id)
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+from database import db, Quiz, Question
+from forms import QuestionForm
+
+# Bulk question import from CSV or JSON-lines.
+#
+# The upload is parsed one row at a time and each row is validated with
+# QuestionForm, so imported questions obey the same rules as those added
+# through the admin page. Valid rows are inserted with executemany in chunks
+# of IMPORT_CHUNK_SIZE; invalid rows are skipped and reported by line number.
+# Everything is committed in one transaction, which also bumps the quiz
+# revision once (re-indexing it for search and dropping its cached pages).
+# An optional ``progress(imported)`` callback is called after each chunk.
+
+QUESTION_FIELDS = ('question_text', 'option1', 'option2', 'option3', 'option4', 'correct_option', 'tag', 'difficulty')
+REQUIRED_FIELDS = ('question_text', 'option1', 'option2', 'correct_option')
+TEXT_FIELDS = ('question_text', 'option1', 'option2', 'option3', 'option4', 'tag')
+MAX_REPORTED_ERRORS = 100
+
+class ImportFileError(Exception):
+    """The file cannot be read at all (unknown format, bad header...)."""
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []  # (line number, message), the first MAX_REPORTED_ERRORS of them
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+def detect_format(filename):
+    if filename.lower().endswith('.csv'):
+        return 'csv'
+    if filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    raise ImportFileError('Unsupported file type; upload a .csv or .jsonl file.')
+
+def _rows(stream, fmt):
+    """Yield ``(line number, dict or error message)`` for each record of a binary stream."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        missing = set(REQUIRED_FIELDS) - set(reader.fieldnames or ())
+        if missing:
+            raise ImportFileError(f"CSV header is missing: {', '.join(sorted(missing))}")
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, f'invalid JSON ({e})'
+                continue
+            yield line_number, record if isinstance(record, dict) else 'expected a JSON object'
+
+def _validate(record):
+    """Return ``(values, None)`` for a valid record or ``(None, message)``."""
+    formdata = MultiDict({name: '' if record.get(name) is None else str(record[name]).strip()
+                          for name in QUESTION_FIELDS})
+    form = QuestionForm(formdata=formdata, meta={'csrf': False})
+    if not form.validate():
+        return None, '; '.join(f'{field}: {error}' for field, errors in form.errors.items() for error in errors)
+
+    values = {name: form[name].data or None for name in TEXT_FIELDS + ('difficulty',)}
+    values['correct_option'] = int(form.correct_option.data)
+    if not values[f"option{values['correct_option']}"]:
+        return None, f"correct_option: option{values['correct_option']} is empty"
+    for name in TEXT_FIELDS:
+        limit = Question.__table__.c[name].type.length
+        if values[name] and len(values[name]) > limit:
+            return None, f'{name}: longer than {limit} characters'
+    return values, None
+
+def import_questions(quiz, stream, fmt, progress=None):
+    """Import questions from ``stream`` (a binary file object) into ``quiz`` and commit."""
+    chunk_size = current_app.config['IMPORT_CHUNK_SIZE']
+    result = ImportResult()
+    chunk = []
+
+    def write(chunk):
+        db.session.execute(insert(Question), chunk)
+        result.imported += len(chunk)
+        if progress:
+            progress(result.imported)
+
+    try:
+        for line, record in _rows(stream, fmt):
+            values, error = _validate(record) if isinstance(record, dict) else (None, record)
+            if error:
+                result.add_error(line, error)
+                continue
+            values['quiz_id'] = quiz.id
+            chunk.append(values)
+            if len(chunk) >= chunk_size:
+                write(chunk)
+                chunk = []
+        if chunk:
+            write(chunk)
+        if result.imported:
+            # Bulk inserts bypass the ORM, so bump the revision by hand
+            quiz.revision = Quiz.revision + 1
+        db.session.commit()
+    except (UnicodeDecodeError, csv.Error) as e:
+        db.session.rollback()
+        raise ImportFileError(f'Could not read the file: {e}')
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
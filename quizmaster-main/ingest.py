@@ -0,0 +1,354 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from database import db, User, Quiz, Question, Score, Answer
+from stats import record_attempt
+from leaderboard import record_score
+
+try:
+    import fcntl
+except ImportError:  # Windows: journals of other live processes cannot be detected
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Write-behind ingestion of quiz scores.
+#
+# attempt_quiz grades the submission, appends it to this process's journal
+# (an fsync'ed JSON-lines file) and queues it; a background thread commits
+# queued scores in batches, so a burst of submissions costs a handful of
+# transactions instead of one write-lock round trip each.
+#
+# Every process owns its journal files and holds an exclusive lock on each
+# for its lifetime. The journal is a series of segments: a new one is started
+# whenever the thread takes a batch, and a segment is deleted as soon as all
+# its entries are committed, so the journal stays about a batch long under
+# steady traffic. At startup, journals nobody holds (left by a crashed or
+# stopped process) are replayed. Each submission carries a submission_id,
+# unique in the Score table, so replaying an entry that was already
+# committed is a no-op.
+#
+# A batch that fails on a busy or unreachable database is retried as a whole.
+# Any other failure is pinned on its entries by writing them one at a time:
+# the good ones are committed, and an entry that fails SCORE_MAX_ATTEMPTS
+# times is moved to dead-letter.jsonl next to the journals, so it cannot hold
+# up later submissions or be replayed at every start. Moving its lines to a
+# scores-<anything>.jsonl file has them replayed at the next start.
+
+DEAD_LETTER = 'dead-letter.jsonl'
+
+class PendingScore:
+    """A graded submission that may not be in the database yet."""
+
+    __slots__ = ('submission_id', 'user_id', 'quiz_id', 'score', 'total_questions',
+                 'percentage', 'time_stamp_of_attempt', 'answers')
+
+    # Score columns; ``answers`` holds [question_id, selected option, is_correct] rows
+    SCORE_FIELDS = __slots__[:-1]
+
+    def __init__(self, submission_id, user_id, quiz_id, score, total_questions, percentage,
+                 time_stamp_of_attempt, answers=None):
+        self.submission_id = submission_id
+        self.user_id = user_id
+        self.quiz_id = quiz_id
+        self.score = score
+        self.total_questions = total_questions
+        self.percentage = percentage
+        self.time_stamp_of_attempt = time_stamp_of_attempt
+        self.answers = answers or []
+
+    def to_json(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data['time_stamp_of_attempt'] = self.time_stamp_of_attempt.isoformat()
+        return json.dumps(data)
+
+    @classmethod
+    def from_json(cls, line):
+        data = json.loads(line)
+        data['time_stamp_of_attempt'] = datetime.fromisoformat(data['time_stamp_of_attempt'])
+        return cls(**data)
+
+
+class ScoreIngestor:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self._queue = queue.Queue()
+        self._pending = {}  # (user_id, quiz_id) -> latest PendingScore not yet committed
+        self._unflushed = 0
+        self._lock = threading.Lock()
+        self._journal = None  # Segment appended to
+        self._journal_path = None
+        self._segments = {}  # path -> [file, entries not settled yet]
+        self._segment_of = {}  # PendingScore -> path of its segment
+        self._journal_dir = None
+        self._failures = {}  # submission_id -> failed attempts, of entries being retried one at a time
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['SCORE_WRITE_BEHIND']
+        if not self.enabled:
+            return
+
+        journal_dir = self._journal_dir = (app.config['SCORE_JOURNAL_DIR']
+                                           or os.path.join(app.instance_path, 'score_journal'))
+        os.makedirs(journal_dir, exist_ok=True)
+        self._start_segment()
+        self._replay_orphans(journal_dir)
+
+        self._thread = threading.Thread(target=self._run, name='score-ingestor', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, user_id, quiz_id, score, total_questions, percentage, answers=None):
+        """Record a graded submission and return it as a PendingScore."""
+        entry = PendingScore(uuid.uuid4().hex, user_id, quiz_id, score, total_questions, percentage,
+                             datetime.utcnow(), answers)
+        if not self.enabled:
+            self._write(db.session, [entry])
+            return entry
+
+        with self._lock:
+            self._append_to_journal([entry])
+            self._pending[(user_id, quiz_id)] = entry
+            self._unflushed += 1
+        self._queue.put(entry)
+        return entry
+
+    def pending_score(self, user_id, quiz_id):
+        """Latest submission of ``user_id`` for ``quiz_id`` still waiting to be written."""
+        return self._pending.get((user_id, quiz_id))
+
+    def discard(self, quiz_ids=(), user_id=None):
+        """Forget the pending submissions of deleted quizzes or a deleted user.
+
+        Their queued entries are dropped when their turn comes (see _write).
+        """
+        quiz_ids = set(quiz_ids)
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == user_id or key[1] in quiz_ids]:
+                del self._pending[key]
+
+    def stop(self):
+        """Flush whatever is queued and stop the background thread."""
+        if self._thread and self._thread.is_alive():
+            self._stopping.set()
+            self._thread.join(timeout=30)
+        if self._journal and not self._journal.closed and self._unflushed == 0:
+            for path, (journal, _) in self._segments.items():
+                journal.close()
+                os.remove(path)
+            self._segments.clear()
+
+    # -- background thread -------------------------------------------------
+
+    def _run(self):
+        interval = self.app.config['SCORE_FLUSH_INTERVAL']
+        batch_size = self.app.config['SCORE_BATCH_SIZE']
+        while not (self._stopping.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            with self._lock:
+                if self._segments[self._journal_path][1]:
+                    self._start_segment()  # Later submissions go to the next segment
+            self._flush(batch)
+
+    def _flush(self, batch):
+        with self.app.app_context():
+            try:
+                self._write(db.session, batch)
+            except OperationalError:
+                # Busy or unreachable database: keep the entries (they are still journaled) and try again later
+                log.exception('Writing %d queued score(s) failed; retrying', len(batch))
+                db.session.rollback()
+                self._requeue(batch)
+                return
+            except Exception:
+                log.exception('Writing %d queued score(s) failed; retrying them one at a time', len(batch))
+                db.session.rollback()
+                batch = self._write_each(batch)
+        self._settle(batch)
+
+    def _write_each(self, batch):
+        """Write ``batch`` one entry per transaction; return the entries done with (written or set aside)."""
+        settled, retry = [], []
+        for entry in batch:
+            try:
+                self._write(db.session, [entry])
+            except OperationalError:
+                db.session.rollback()
+                retry.append(entry)
+            except Exception:
+                db.session.rollback()
+                attempts = self._failures.get(entry.submission_id, 0) + 1
+                if attempts < self.app.config['SCORE_MAX_ATTEMPTS']:
+                    self._failures[entry.submission_id] = attempts
+                    retry.append(entry)
+                    continue
+                log.exception('Giving up on score %s after %d attempts; moved to %s',
+                              entry.submission_id, attempts, DEAD_LETTER)
+                self._failures.pop(entry.submission_id, None)
+                self._dead_letter(entry)
+                settled.append(entry)
+            else:
+                self._failures.pop(entry.submission_id, None)
+                settled.append(entry)
+        if retry:
+            self._requeue(retry)
+        return settled
+
+    def _requeue(self, entries):
+        time.sleep(self.app.config['SCORE_FLUSH_INTERVAL'])
+        for entry in entries:
+            self._queue.put(entry)
+
+    def _settle(self, entries):
+        """Forget ``entries``, now committed or set aside."""
+        with self._lock:
+            for entry in entries:
+                key = (entry.user_id, entry.quiz_id)
+                if self._pending.get(key) is entry:
+                    del self._pending[key]
+            self._unflushed -= len(entries)
+            for entry in entries:
+                path = self._segment_of.pop(entry)
+                segment = self._segments[path]
+                segment[1] -= 1
+                if segment[1] == 0 and path != self._journal_path:
+                    # Everything in this segment is committed or set aside
+                    segment[0].close()
+                    os.remove(path)
+                    del self._segments[path]
+
+    @staticmethod
+    def _write(session, entries):
+        """Insert ``entries`` in one transaction, skipping already committed ones.
+
+        Entries of quizzes or users deleted since the submission are dropped.
+        """
+        existing = set(session.execute(
+            db.select(Score.submission_id)
+            .where(Score.submission_id.in_([entry.submission_id for entry in entries]))
+        ).scalars())
+        quiz_ids = set(session.execute(
+            db.select(Quiz.id).where(Quiz.id.in_({entry.quiz_id for entry in entries}))
+        ).scalars())
+        user_ids = set(session.execute(
+            db.select(User.id).where(User.id.in_({entry.user_id for entry in entries}))
+        ).scalars())
+        written = []
+        for entry in entries:
+            if entry.submission_id in existing:
+                continue
+            if entry.quiz_id not in quiz_ids or entry.user_id not in user_ids:
+                log.info('Dropping score %s: its quiz or user was deleted', entry.submission_id)
+                continue
+            existing.add(entry.submission_id)
+            score = Score(**{name: getattr(entry, name) for name in PendingScore.SCORE_FIELDS})
+            session.add(score)
+            record_attempt(score)  # Keep the user's summary row and standings in the same transaction
+            record_score(score)
+            written.append((score, entry))
+
+        question_ids = {row[0] for _, entry in written for row in entry.answers}
+        if question_ids:
+            session.flush()  # Assigns the Score ids the answers point to
+            # Questions deleted since the submission are left out
+            question_ids = set(session.execute(
+                db.select(Question.id).where(Question.id.in_(question_ids))).scalars())
+            session.execute(insert(Answer), [
+                {'score_id': score.id, 'quiz_id': entry.quiz_id, 'question_id': question_id,
+                 'selected_option': selected, 'is_correct': is_correct}
+                for score, entry in written
+                for question_id, selected, is_correct in entry.answers
+                if question_id in question_ids
+            ])
+        session.commit()
+
+    # -- journal -------------------------------------------------------------
+
+    def _append_to_journal(self, entries):
+        self._journal.write(''.join(entry.to_json() + '\n' for entry in entries))
+        self._journal.flush()
+        if self.app.config['SCORE_JOURNAL_FSYNC']:
+            os.fsync(self._journal.fileno())
+        self._segments[self._journal_path][1] += len(entries)
+        for entry in entries:
+            self._segment_of[entry] = self._journal_path
+
+    def _start_segment(self):
+        """Append to a new segment from now on; the previous one goes once its entries are settled."""
+        self._journal, self._journal_path = self._open_journal(self._journal_dir)
+        self._segments[self._journal_path] = [self._journal, 0]
+
+    def _dead_letter(self, entry):
+        with open(os.path.join(self._journal_dir, DEAD_LETTER), 'a') as dead:
+            dead.write(entry.to_json() + '\n')
+
+    @staticmethod
+    def _open_journal(journal_dir):
+        """Create and lock a new journal file.
+
+        The file is locked under a name the orphan scan does not match and
+        only then renamed, so another process can never adopt it unlocked.
+        """
+        path = os.path.join(journal_dir, f'scores-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl')
+        journal = open(path + '.tmp', 'a')
+        if fcntl:
+            fcntl.flock(journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(path + '.tmp', path)
+        return journal, path
+
+    def _replay_orphans(self, journal_dir):
+        """Adopt the journals of processes that are gone and queue their entries."""
+        for path in glob.glob(os.path.join(journal_dir, 'scores-*.jsonl')):
+            if path in self._segments:
+                continue
+            try:
+                orphan = open(path, 'r')
+            except FileNotFoundError:
+                continue  # Adopted by another process meanwhile
+            with orphan:
+                if fcntl:
+                    try:
+                        fcntl.flock(orphan, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue  # Owned by a live process
+                if os.fstat(orphan.fileno()).st_nlink == 0:
+                    continue  # Adopted and removed by another process before we got the lock
+                entries = []
+                for line in orphan:
+                    try:
+                        entries.append(PendingScore.from_json(line))
+                    except (ValueError, TypeError, KeyError):
+                        log.warning('Skipping unreadable line in %s', path)  # e.g. a torn last write
+                if entries:
+                    with self._lock:
+                        self._append_to_journal(entries)
+                        self._unflushed += len(entries)
+                    for entry in entries:
+                        self._queue.put(entry)
+                    log.info('Replaying %d score(s) from %s', len(entries), path)
+                os.remove(path)  # While still holding the lock
+
+
+score_ingestor = ScoreIngestor()
@@ -0,0 +1,264 @@
+import atexit
+import contextlib
+import json
+import logging
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import update
+from database import db, Job, Quiz, LeaderboardEntry
+import deletion
+import importer
+from exports import export_results, gzip_chunks
+from leaderboard import rebuild_leaderboards
+from search import init_search_index, reindex_quizzes
+from stats import rebuild_user_stats
+
+log = logging.getLogger(__name__)
+
+# Background jobs for heavy admin operations.
+#
+# Bulk deletes, question imports, result exports and rebuilds of derived
+# tables are recorded in the Job table and run by a pool of JOB_WORKERS
+# threads inside the web process, so the request that starts one returns at
+# once and the admin's browser polls /admin/jobs/<id> for its progress. No
+# broker is involved: the Job row is the durable record of each job.
+#
+# A running job's progress is kept in memory (the polling endpoint prefers
+# it) and written to its row at most every JOB_PROGRESS_INTERVAL seconds, and
+# only between the job's own transactions: on SQLite a write from inside one
+# would wait for the job's own lock.
+#
+# Jobs are owned by the process that queued them. When a process starts, jobs
+# of dead processes on the same host are recovered: queued ones are run,
+# running ones are marked failed since they were cut short. (Deletes are
+# chunked transactions, so a cut-short delete leaves whole quizzes behind and
+# can simply be started again.)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+OWNER = f'{socket.gethostname()}:{os.getpid()}'
+
+_handlers = {}  # kind -> function(job, **params)
+
+def handler(kind):
+    """Register the decorated function as the handler of jobs of ``kind``."""
+    def register(func):
+        _handlers[kind] = func
+        return func
+    return register
+
+class JobFailed(Exception):
+    """Raised by a handler to fail its job with a message for the admin."""
+
+class RunningJob:
+    """What a handler gets to report its progress."""
+
+    def __init__(self, runner, job_id):
+        self.runner = runner
+        self.id = job_id
+        self._written_at = time.monotonic()
+
+    def progress(self, done, total=None):
+        """Record ``done`` units of work out of ``total``."""
+        self.runner._progress[self.id] = (done, total)
+        interval = self.runner.app.config['JOB_PROGRESS_INTERVAL']
+        if time.monotonic() - self._written_at >= interval and not db.session().in_transaction():
+            db.session.execute(update(Job).where(Job.id == self.id).values(progress=done, total=total))
+            db.session.commit()
+            self._written_at = time.monotonic()
+
+class JobRunner:
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._progress = {}  # job id -> (done, total), for jobs running in this process
+
+    def init_app(self, app):
+        self.app = app
+        if app.config['JOB_WORKERS'] > 0:
+            self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_WORKERS'], thread_name_prefix='job')
+            atexit.register(self.stop)
+        with app.app_context():
+            self._recover()
+
+    def enqueue(self, kind, created_by=None, **params):
+        """Record a job and start it; return the Job (already finished when JOB_WORKERS is 0)."""
+        if kind not in _handlers:
+            raise ValueError(f'Unknown job kind: {kind}')
+        job = Job(kind=kind, params=json.dumps(params), status=QUEUED, owner=OWNER, created_by=created_by)
+        db.session.add(job)
+        db.session.commit()
+        self._submit(job.id)
+        if self._executor is None:
+            db.session.refresh(job)
+        return job
+
+    def status(self, job):
+        """The job as JSON-ready data, with the latest progress of this process."""
+        done, total = self._progress.get(job.id, (job.progress, job.total))
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'progress': done,
+            'total': total,
+            'result': json.loads(job.result) if job.result else None,
+            'error': job.error,
+            'created_at': job.created_at.isoformat() + 'Z',
+            'started_at': job.started_at.isoformat() + 'Z' if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() + 'Z' if job.finished_at else None,
+        }
+
+    def stop(self):
+        """Wait for the running jobs; queued ones are run by the next process."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, job_id):
+        if self._executor is None:
+            self._run(job_id)
+        else:
+            self._executor.submit(self._run, job_id)
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, owner=OWNER, started_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                return  # Another process recovered it first
+            job = db.session.get(Job, job_id)
+            kind, params = job.kind, json.loads(job.params)
+            try:
+                result = _handlers[kind](RunningJob(self, job_id), **params)
+            except Exception as e:
+                db.session.rollback()
+                if not isinstance(e, JobFailed):
+                    log.exception('Job %d (%s) failed', job_id, kind)
+                self._finish(job_id, FAILED, error=str(e) or e.__class__.__name__)
+            else:
+                self._finish(job_id, DONE, result=json.dumps(result) if result is not None else None)
+
+    def _finish(self, job_id, status, **values):
+        done, total = self._progress.pop(job_id, (None, None))
+        if done is not None:
+            values.update(progress=total if status == DONE and total else done, total=total)
+        db.session.execute(update(Job).where(Job.id == job_id)
+                           .values(status=status, finished_at=datetime.utcnow(), **values))
+        db.session.commit()
+
+    def _recover(self):
+        """Run the queued jobs and fail the running ones of dead processes on this host."""
+        host = OWNER.rsplit(':', 1)[0]
+        orphans = Job.query.filter(Job.status.in_((QUEUED, RUNNING)),
+                                   Job.owner.startswith(f'{host}:', autoescape=True)).all()
+        queued = []
+        for job in orphans:
+            if _process_alive(int(job.owner.rsplit(':', 1)[1])):
+                continue
+            if job.status == RUNNING:
+                job.status, job.finished_at = FAILED, datetime.utcnow()
+                job.error = 'Interrupted: the process running it stopped. Start it again.'
+            else:
+                job.owner = OWNER
+                queued.append(job.id)
+        db.session.commit()
+        for job_id in queued:
+            self._submit(job_id)
+
+def _process_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Alive, owned by another user
+    return True
+
+
+jobs = JobRunner()
+
+
+# -- handlers ----------------------------------------------------------------
+
+@handler('delete_subjects')
+def _delete_subjects(job, subject_ids):
+    deletion.delete_subjects(subject_ids, progress=job.progress)
+    return {'deleted': len(subject_ids)}
+
+@handler('delete_chapters')
+def _delete_chapters(job, chapter_ids):
+    deletion.delete_chapters(chapter_ids, progress=job.progress)
+    return {'deleted': len(chapter_ids)}
+
+@handler('delete_quizzes')
+def _delete_quizzes(job, quiz_ids):
+    deletion.delete_quizzes(quiz_ids, progress=job.progress)
+    return {'deleted': len(quiz_ids)}
+
+@handler('delete_user')
+def _delete_user(job, user_id):
+    deletion.delete_user(user_id)
+    return {'deleted': 1}
+
+@handler('import_questions')
+def _import_questions(job, quiz_id, path, fmt):
+    """Import an uploaded file (saved under <instance>/uploads), then remove it."""
+    try:
+        quiz = db.session.get(Quiz, quiz_id)
+        if quiz is None:
+            raise JobFailed(f'Quiz {quiz_id} no longer exists.')
+        with open(path, 'rb') as stream:
+            try:
+                result = importer.import_questions(quiz, stream, fmt, progress=job.progress)
+            except importer.ImportFileError as e:
+                raise JobFailed(str(e))
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+    return {'quiz_id': quiz_id, 'imported': result.imported, 'error_count': result.error_count,
+            'errors': result.errors[:10]}
+
+@handler('export_results')
+def _export_results(job, fmt, compress=False, date_from=None, date_to=None, **filters):
+    """Write a results export to <instance>/exports, to be downloaded from the jobs page."""
+    filters['date_from'] = datetime.fromisoformat(date_from) if date_from else None
+    filters['date_to'] = datetime.fromisoformat(date_to) if date_to else None
+    chunks = export_results(fmt, **filters)
+    filename = f'results-{job.id}.{fmt}'
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+    directory = os.path.join(job.runner.app.instance_path, 'exports')
+    os.makedirs(directory, exist_ok=True)
+    size = 0
+    with open(os.path.join(directory, filename), 'wb') as out:
+        for chunk in chunks:
+            data = chunk.encode() if isinstance(chunk, str) else chunk
+            out.write(data)
+            size += len(data)
+    return {'filename': filename, 'bytes': size}
+
+@handler('rebuild_user_stats')
+def _rebuild_user_stats(job):
+    rebuild_user_stats(db.session.connection())
+    db.session.commit()
+
+@handler('rebuild_leaderboards')
+def _rebuild_leaderboards(job):
+    rebuild_leaderboards(db.session.connection())
+    db.session.info['leaderboards_reset'] = True
+    db.session.commit()
+    return {'entries': LeaderboardEntry.query.count()}
+
+@handler('rebuild_search_index')
+def _rebuild_search_index(job):
+    init_search_index()
+    reindex_quizzes(db.session.connection())
+    db.session.commit()
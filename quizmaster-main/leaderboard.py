@@ -0,0 +1,215 @@
+import threading
+from datetime import datetime
+from flask import current_app
+from sortedcontainers import SortedList
+from sqlalchemy import and_, delete, event, func, insert, literal, select, update
+from cache import TTLCache, on_commit
+from database import db, Chapter, Quiz, Score, LeaderboardEntry
+
+# Per-quiz and per-subject leaderboards.
+#
+# A quiz board ranks users by their best percentage on the quiz; a subject
+# board by the sum of their best percentages over the subject's quizzes. Ties
+# go to whoever reached the points first.
+#
+# LeaderboardEntry holds the standings and is updated in the same transaction
+# as each new Score (record_score, called by the score ingestor). Boards that
+# are being read are also kept in memory as sorted lists (SortedList, so a
+# patch, a top-N slice and a rank lookup are all O(log n) plus the slice),
+# patched after every commit. Other processes'
+# writes show up when a board is reloaded, at most LEADERBOARD_TTL seconds
+# later. `flask rebuild-leaderboards` recomputes everything from Score.
+
+QUIZ, SUBJECT = 'quiz', 'subject'
+
+_boards = TTLCache(maxsize=256, name='leaderboards')
+_quiz_subjects = TTLCache(maxsize=4096, name='quiz_subjects')
+_lock = threading.Lock()
+
+def _rank_key(user_id, points, achieved_at):
+    return (-points, achieved_at or datetime.min, user_id)
+
+class Board:
+    """Standings of one leaderboard, kept sorted by rank."""
+
+    def __init__(self, rows):
+        self._by_user = {user_id: _rank_key(user_id, points, achieved_at)
+                         for user_id, points, achieved_at in rows}
+        self._keys = SortedList(self._by_user.values())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def set(self, user_id, points, achieved_at):
+        old = self._by_user.get(user_id)
+        if old is not None:
+            self._keys.remove(old)
+        key = self._by_user[user_id] = _rank_key(user_id, points, achieved_at)
+        self._keys.add(key)
+
+    def top(self, limit):
+        """``(rank, user_id, points)`` of the first ``limit`` places."""
+        return [(rank, key[2], -key[0]) for rank, key in enumerate(self._keys.islice(stop=limit), start=1)]
+
+    def rank(self, user_id):
+        """``(rank, points)`` of ``user_id``, or None if not on the board."""
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return self._keys.bisect_left(key) + 1, -key[0]
+
+def get_board(board, board_id):
+    """The in-memory Board for ``(board, board_id)``, loaded from LeaderboardEntry if needed."""
+    with _lock:
+        loaded = _boards.get((board, board_id))
+    if loaded is None:
+        rows = db.session.execute(
+            select(LeaderboardEntry.user_id, LeaderboardEntry.points, LeaderboardEntry.achieved_at)
+            .where(LeaderboardEntry.board == board, LeaderboardEntry.board_id == board_id)
+        ).all()
+        loaded = Board(rows)
+        with _lock:
+            _boards.set((board, board_id), loaded, ttl=current_app.config['LEADERBOARD_TTL'])
+    return loaded
+
+def standings(board, board_id, user_id, limit):
+    """``(top places, user's (rank, points) or None, board size)`` of one board."""
+    loaded = get_board(board, board_id)
+    with _lock:
+        return loaded.top(limit), loaded.rank(user_id), len(loaded)
+
+def _subject_of(quiz_id):
+    """Id of the subject of ``quiz_id``, or None if the quiz no longer exists."""
+    subject_id = _quiz_subjects.get(quiz_id)
+    if subject_id is None:
+        subject_id = db.session.execute(
+            select(Chapter.subject_id).join(Quiz, Quiz.chapter_id == Chapter.id).where(Quiz.id == quiz_id)
+        ).scalar()
+        if subject_id is not None:
+            _quiz_subjects.set(quiz_id, subject_id)
+    return subject_id
+
+def _save(board, board_id, user_id, points, achieved_at):
+    """Write one entry in the current transaction and queue the in-memory update."""
+    values = {'points': points, 'achieved_at': achieved_at}
+    result = db.session.execute(
+        update(LeaderboardEntry)
+        .where(LeaderboardEntry.board == board, LeaderboardEntry.board_id == board_id,
+               LeaderboardEntry.user_id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.execute(insert(LeaderboardEntry).values(board=board, board_id=board_id, user_id=user_id, **values))
+    db.session.info.setdefault('leaderboard_updates', []).append((board, board_id, user_id, points, achieved_at))
+
+def record_score(score):
+    """Fold a new ``score`` into its quiz and subject boards, in the caller's transaction."""
+    def current(board, board_id):
+        return db.session.execute(
+            select(LeaderboardEntry.points)
+            .where(LeaderboardEntry.board == board, LeaderboardEntry.board_id == board_id,
+                   LeaderboardEntry.user_id == score.user_id)
+        ).scalar()
+
+    subject_id = _subject_of(score.quiz_id)
+    if subject_id is None:
+        return  # The quiz was deleted: it has no boards any more
+
+    best = current(QUIZ, score.quiz_id)
+    if best is not None and score.percentage <= best:
+        return  # Not an improvement: no board changes
+    _save(QUIZ, score.quiz_id, score.user_id, score.percentage, score.time_stamp_of_attempt)
+
+    total = (current(SUBJECT, subject_id) or 0) + score.percentage - (best or 0)
+    _save(SUBJECT, subject_id, score.user_id, total, score.time_stamp_of_attempt)
+
+def rebuild_leaderboards(connection, user_ids=None):
+    """Recompute LeaderboardEntry from the Score table, for ``user_ids`` or everyone."""
+    best = (
+        select(Score.user_id, Score.quiz_id, func.max(Score.percentage).label('points'))
+        .group_by(Score.user_id, Score.quiz_id)
+    )
+    clear = delete(LeaderboardEntry)
+    if user_ids is not None:
+        best = best.where(Score.user_id.in_(user_ids))
+        clear = clear.where(LeaderboardEntry.user_id.in_(user_ids))
+    best = best.subquery()
+
+    # Quiz boards: best percentage, reached at the first attempt that scored it
+    quiz_entries = (
+        select(literal(QUIZ), best.c.quiz_id, best.c.user_id, best.c.points,
+               func.min(Score.time_stamp_of_attempt))
+        .join(Score, and_(Score.user_id == best.c.user_id, Score.quiz_id == best.c.quiz_id,
+                          Score.percentage == best.c.points))
+        .group_by(best.c.quiz_id, best.c.user_id, best.c.points)
+    )
+    # Subject boards: sum of the quiz bests, reached with the latest of them
+    subject_entries = (
+        select(literal(SUBJECT), Chapter.subject_id, LeaderboardEntry.user_id,
+               func.sum(LeaderboardEntry.points), func.max(LeaderboardEntry.achieved_at))
+        .join(Quiz, Quiz.id == LeaderboardEntry.board_id)
+        .join(Chapter, Chapter.id == Quiz.chapter_id)
+        .where(LeaderboardEntry.board == QUIZ)
+        .group_by(Chapter.subject_id, LeaderboardEntry.user_id)
+    )
+    if user_ids is not None:
+        subject_entries = subject_entries.where(LeaderboardEntry.user_id.in_(user_ids))
+
+    columns = ['board', 'board_id', 'user_id', 'points', 'achieved_at']
+    connection.execute(clear)
+    connection.execute(insert(LeaderboardEntry).from_select(columns, quiz_entries))
+    connection.execute(insert(LeaderboardEntry).from_select(columns, subject_entries))
+
+def remove_user(session, user_id):
+    """Take ``user_id`` off every board (for bulk deletes that bypass the ORM)."""
+    session.execute(delete(LeaderboardEntry).where(LeaderboardEntry.user_id == user_id))
+    session.info['leaderboards_reset'] = True
+
+def refresh_users(session, user_ids):
+    """Recompute the entries of ``user_ids`` after their scores were bulk deleted."""
+    if user_ids:
+        rebuild_leaderboards(session.connection(), user_ids)
+        session.info['leaderboards_reset'] = True
+
+# Deleted scores (quiz/chapter/subject cascades) change their owners'
+# standings: recompute those users' entries in the same transaction.
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_deleted_scores(session, flush_context):
+    user_ids = {obj.user_id for obj in session.deleted if isinstance(obj, Score)}
+    if user_ids:
+        session.info.setdefault('stale_leaderboard_users', set()).update(user_ids)
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _rebuild_stale_entries(session, flush_context):
+    user_ids = session.info.pop('stale_leaderboard_users', None)
+    if user_ids:
+        rebuild_leaderboards(session.connection(), user_ids)
+        session.info['leaderboards_reset'] = True
+
+# In-memory boards follow committed changes only.
+
+@event.listens_for(db.session, 'after_commit')
+def _apply_committed(session):
+    updates = session.info.pop('leaderboard_updates', None)
+    with _lock:
+        if session.info.pop('leaderboards_reset', False):
+            _boards.clear()
+            return
+        for board, board_id, user_id, points, achieved_at in updates or ():
+            loaded = _boards.get((board, board_id))
+            if loaded is not None:
+                loaded.set(user_id, points, achieved_at)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop('leaderboard_updates', None)
+    session.info.pop('leaderboards_reset', None)
+
+@on_commit(Quiz)
+def _drop_quiz_subjects(changes):
+    # A quiz moved to another chapter counts for its new subject from now on
+    # (rebuild-leaderboards moves the points it already gave)
+    for quiz_id in changes.get(Quiz, ()):
+        _quiz_subjects.pop(quiz_id)
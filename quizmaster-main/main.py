@@ -1,53 +1,95 @@
+import logging
+import os
 from flask import Flask
 from flask_login import LoginManager
-from config import Config
-from database import db, User
+from flask_migrate import Migrate
+from sqlalchemy import inspect
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config, config_by_name
+from database import db, init_engine
 from routes import main_bp, auth_bp, admin_bp, user_bp
-from werkzeug.security import generate_password_hash
-from datetime import datetime
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Initialize database
-db.init_app(app)
-
-# Initialize Flask-Login
-login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'auth.login'  # Set the login view
-
-# User loader function for Flask-Login
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# Register blueprints
-app.register_blueprint(main_bp)
-app.register_blueprint(auth_bp, url_prefix='/auth')
-app.register_blueprint(admin_bp, url_prefix='/admin')
-app.register_blueprint(user_bp, url_prefix='/user')
-
-# Create database tables and add admin user (if not exists)
-with app.app_context():
-    db.create_all()
-
-    # Check if admin user exists, if not create one
-    admin = User.query.filter_by(email='tulikakotiyal2004@gmail.com').first()  # Use 'email' to check for admin
-    if not admin:
-        admin = User(
-            username='Tulika Kotiyal',  # Set the admin username
-            email='tulikakotiyal2004@gmail.com',  # Set the admin email
-            password=generate_password_hash('admin_Tulika123'),  # Set the admin password (hash it)
-            full_name='Tulika Kotiyal',
-            qualification='System Administrator',
-            dob=datetime.strptime('2004-07-26', '%Y-%m-%d').date(),  # Convert to date object
-            is_admin=True  # Mark this user as an admin
-        )
-        db.session.add(admin)
-        db.session.commit()
-        print('Admin user created!')
+from api import api_bp
+from commands import register_commands
+import identity
+from metrics import metrics
+from ingest import score_ingestor
+from attempts import autosaves
+from jobs import jobs
+from search import init_search
+
+log = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def create_app(config=None):
+    """Create the app with ``config`` (default: the class FLASK_ENV selects, see config.py).
+
+    Creating the app does not create or alter any table: run ``flask init-db``
+    once per database (and ``flask upgrade-db`` after updating the code).
+    The background services (score ingestion, autosave flushing, job workers)
+    are started per process, so create one app per process, after forking.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config or config_by_name.get(os.environ.get('FLASK_ENV'), Config))
+
+    # Trust the X-Forwarded-* headers set by PROXY_FIX_HOPS reverse proxies
+    hops = app.config['PROXY_FIX_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    # Initialize database
+    db.init_app(app)
+    init_engine(app)
+
+    # Alembic migrations (`flask db ...`; applied by `flask init-db`, see schema.py)
+    Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+
+    # Initialize Flask-Login
+    login_manager = LoginManager()
+    login_manager.init_app(app)
+    login_manager.login_view = 'auth.login'  # Set the login view
+
+    # User loader function for Flask-Login (cached, see identity.py)
+    identity.init_app(app, login_manager)
+
+    # Opt-in request metrics and profiling (see metrics.py)
+    metrics.init_app(app)
+
+    # Register blueprints
+    app.register_blueprint(main_bp)
+    app.register_blueprint(auth_bp, url_prefix='/auth')
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    app.register_blueprint(user_bp, url_prefix='/user')
+    app.register_blueprint(api_bp, url_prefix='/api/v1')
+
+    # Register CLI commands
+    register_commands(app)
+
+    # Full-text search when the database supports it (see search.py)
+    init_search(app)
+
+    with app.app_context():
+        missing = set(db.metadata.tables) - set(inspect(db.engine).get_table_names())
+    if missing:
+        # The services read and write these tables; `flask init-db` needs none of them
+        log.warning('Database is missing table(s) %s; run `flask init-db` or `flask upgrade-db`. '
+                    'Background services are not started.', ', '.join(sorted(missing)))
+    else:
+        start_services(app)
+
+    return app
+
+def start_services(app):
+    """Start the background threads of ``app``; its tables must exist."""
+    # Start the write-behind score ingestion (replays any leftover journal)
+    score_ingestor.init_app(app)
+
+    # Start the periodic writer of autosaved quiz answers
+    autosaves.init_app(app)
+
+    # Start the background job workers (runs jobs left queued by stopped processes)
+    jobs.init_app(app)
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; see README.md for running in production
+    create_app().run(debug=True)
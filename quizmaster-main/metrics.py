@@ -0,0 +1,214 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from flask import before_render_template, g, request, template_rendered
+from sqlalchemy import event
+from cache import caches
+from database import db
+
+# Opt-in request instrumentation (METRICS_ENABLED).
+#
+# A random METRICS_SAMPLE_RATE share of requests is measured: latency per
+# endpoint (as a histogram), the number of SQL statements and the time spent
+# in them, and the time spent rendering templates. Requests that are not
+# sampled only pay for one random() call, and with METRICS_ENABLED off no
+# hook is installed at all. The numbers are exposed in Prometheus text format
+# at /admin/metrics; each worker process keeps its own.
+#
+# With PROFILE_SLOW_REQUESTS_MS set, a PROFILE_SAMPLE_RATE share of requests
+# also runs under cProfile, and the profile of any that takes longer than the
+# threshold is dumped to PROFILE_DIR (open it with pstats or snakeviz).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_BUCKET_LABELS = [f'{bound:g}' for bound in LATENCY_BUCKETS] + ['+Inf']
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects it."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+class EndpointStats:
+    __slots__ = ('latency', 'responses', 'sql_count', 'sql_seconds', 'template_seconds')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.responses = {}  # status code -> count
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+
+class Metrics:
+    def __init__(self):
+        self.app = None
+        self.enabled = False
+        self.sample_rate = 0.0
+        self.profile_threshold = 0.0
+        self.profile_rate = 0.0
+        self.profile_dir = None
+        self.profiles_dumped = 0
+        self._endpoints = {}  # endpoint -> EndpointStats
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config['METRICS_ENABLED']
+        if not self.enabled:
+            return
+        self.sample_rate = app.config['METRICS_SAMPLE_RATE']
+        self.profile_threshold = app.config['PROFILE_SLOW_REQUESTS_MS'] / 1000
+        self.profile_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.profile_dir = app.config['PROFILE_DIR'] or os.path.join(app.instance_path, 'profiles')
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._statement_started)
+            event.listen(db.engine, 'after_cursor_execute', self._statement_finished)
+
+    # -- request hooks --------------------------------------------------------
+
+    def _before_request(self):
+        if random.random() >= self.sample_rate:
+            return
+        g.metrics = {'sql_count': 0, 'sql_seconds': 0.0, 'template_seconds': 0.0, 'templates': [],
+                     'profiler': None}
+        if self.profile_threshold and random.random() < self.profile_rate:
+            g.metrics['profiler'] = cProfile.Profile()
+            g.metrics['profiler'].enable()
+        g.metrics['started'] = time.perf_counter()
+
+    def _after_request(self, response):
+        self._finish(response.status_code)
+        return response
+
+    def _teardown_request(self, exc):
+        self._finish(500)  # Only still pending when the view raised
+
+    def _finish(self, status):
+        sample = g.pop('metrics', None)
+        if sample is None:
+            return
+        elapsed = time.perf_counter() - sample['started']
+        endpoint = request.endpoint or 'unmatched'
+        if sample['profiler'] is not None:
+            sample['profiler'].disable()
+            if elapsed >= self.profile_threshold:
+                self._dump_profile(sample['profiler'], endpoint, elapsed)
+
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.latency.observe(elapsed)
+            stats.responses[status] = stats.responses.get(status, 0) + 1
+            stats.sql_count += sample['sql_count']
+            stats.sql_seconds += sample['sql_seconds']
+            stats.template_seconds += sample['template_seconds']
+
+    def _dump_profile(self, profiler, endpoint, elapsed):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9_]+', '_', endpoint)
+        name = f'{datetime.utcnow():%Y%m%dT%H%M%S}-{slug}-{elapsed * 1000:.0f}ms.prof'
+        profiler.dump_stats(os.path.join(self.profile_dir, name))
+        self.profiles_dumped += 1
+
+    # -- SQL and template timing ---------------------------------------------
+
+    @staticmethod
+    def _current_sample():
+        return g.get('metrics') if g else None
+
+    def _statement_started(self, conn, cursor, statement, parameters, context, executemany):
+        if self._current_sample() is not None:
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _statement_finished(self, conn, cursor, statement, parameters, context, executemany):
+        sample = self._current_sample()
+        if sample is not None and conn.info.get('metrics_started'):
+            sample['sql_count'] += 1
+            sample['sql_seconds'] += time.perf_counter() - conn.info['metrics_started'].pop()
+
+    def _template_started(self, sender, template, context, **extra):
+        sample = self._current_sample()
+        if sample is not None:
+            sample['templates'].append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        sample = self._current_sample()
+        if sample is not None and sample['templates']:
+            started = sample['templates'].pop()
+            if not sample['templates']:  # Count nested renders once
+                sample['template_seconds'] += time.perf_counter() - started
+
+    # -- exposition -------------------------------------------------------------
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP quizmaster_metrics_sample_rate Share of requests that are measured.',
+            '# TYPE quizmaster_metrics_sample_rate gauge',
+            f'quizmaster_metrics_sample_rate {self.sample_rate if self.enabled else 0}',
+            '# HELP quizmaster_request_duration_seconds Latency of sampled requests.',
+            '# TYPE quizmaster_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            for endpoint, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(_BUCKET_LABELS, stats.latency.counts):
+                    cumulative += count
+                    lines.append(f'quizmaster_request_duration_seconds_bucket'
+                                 f'{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+                lines.append(f'quizmaster_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats.latency.sum:.6f}')
+                lines.append(f'quizmaster_request_duration_seconds_count{{endpoint="{endpoint}"}} {cumulative}')
+
+            counters = (
+                ('quizmaster_requests_total', 'Sampled requests by response status.', None),
+                ('quizmaster_sql_queries_total', 'SQL statements issued by sampled requests.', 'sql_count'),
+                ('quizmaster_sql_seconds_total', 'Time sampled requests spent in SQL.', 'sql_seconds'),
+                ('quizmaster_template_seconds_total', 'Time sampled requests spent rendering templates.',
+                 'template_seconds'),
+            )
+            for name, help_text, attribute in counters:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, stats in endpoints:
+                    if attribute is None:
+                        lines += [f'{name}{{endpoint="{endpoint}",status="{status}"}} {count}'
+                                  for status, count in sorted(stats.responses.items())]
+                    else:
+                        lines.append(f'{name}{{endpoint="{endpoint}"}} {getattr(stats, attribute):g}')
+
+        lines += ['# HELP quizmaster_profiles_dumped_total cProfile dumps of slow requests.',
+                  '# TYPE quizmaster_profiles_dumped_total counter',
+                  f'quizmaster_profiles_dumped_total {self.profiles_dumped}']
+        for name, help_text, key, kind in (
+            ('quizmaster_cache_entries', 'Entries in an in-process cache.', 'size', 'gauge'),
+            ('quizmaster_cache_hits_total', 'In-process cache hits.', 'hits', 'counter'),
+            ('quizmaster_cache_misses_total', 'In-process cache misses.', 'misses', 'counter'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+            lines += [f'{name}{{cache="{cache}"}} {stats[key]}'
+                      for cache, stats in sorted((cache, c.stats()) for cache, c in caches.items())]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
@@ -0,0 +1,227 @@
+"""baseline schema
+
+The schema of databases created before migrations, once brought up to date
+by schema.upgrade_schema() (see schema.init_db).
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-16 23:31:02.407018
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=40), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('progress', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=True),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('owner', sa.String(length=80), nullable=True),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_job_status'), ['status'], unique=False)
+
+    op.create_table('subject',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('description', sa.String(length=500), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=False),
+    sa.Column('password', sa.String(length=120), nullable=False),
+    sa.Column('full_name', sa.String(length=120), nullable=False),
+    sa.Column('qualification', sa.String(length=120), nullable=True),
+    sa.Column('dob', sa.Date(), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('chapter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.Column('description', sa.String(length=500), nullable=True),
+    sa.Column('subject_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['subject_id'], ['subject.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_chapter_subject_id'), ['subject_id'], unique=False)
+
+    op.create_table('leaderboard_entry',
+    sa.Column('board', sa.String(length=10), nullable=False),
+    sa.Column('board_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Float(), nullable=False),
+    sa.Column('achieved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('board', 'board_id', 'user_id')
+    )
+    with op.batch_alter_table('leaderboard_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_leaderboard_entry_user_id'), ['user_id'], unique=False)
+
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('attempt_count', sa.Integer(), nullable=False),
+    sa.Column('percentage_sum', sa.Float(), nullable=False),
+    sa.Column('best_percentage', sa.Float(), nullable=False),
+    sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('quiz',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('title', sa.String(length=120), nullable=False),
+    sa.Column('chapter_id', sa.Integer(), nullable=False),
+    sa.Column('date_of_quiz', sa.Date(), nullable=False),
+    sa.Column('time_duration', sa.String(length=5), nullable=False),
+    sa.Column('remarks', sa.String(length=500), nullable=True),
+    sa.Column('revision', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('pool_size', sa.Integer(), nullable=True),
+    sa.Column('pool_strata', sa.String(length=10), nullable=True),
+    sa.ForeignKeyConstraint(['chapter_id'], ['chapter.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_quiz_chapter_id'), ['chapter_id'], unique=False)
+
+    op.create_table('question',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('question_text', sa.String(length=500), nullable=False),
+    sa.Column('option1', sa.String(length=200), nullable=False),
+    sa.Column('option2', sa.String(length=200), nullable=False),
+    sa.Column('option3', sa.String(length=200), nullable=True),
+    sa.Column('option4', sa.String(length=200), nullable=True),
+    sa.Column('correct_option', sa.Integer(), nullable=False),
+    sa.Column('tag', sa.String(length=50), nullable=True),
+    sa.Column('difficulty', sa.String(length=10), nullable=True),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('question', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_question_quiz_id'), ['quiz_id'], unique=False)
+
+    op.create_table('quiz_attempt',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('revision', sa.Integer(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=False),
+    sa.Column('deadline', sa.DateTime(), nullable=True),
+    sa.Column('seed', sa.Integer(), nullable=True),
+    sa.Column('question_ids', sa.Text(), nullable=False),
+    sa.Column('answers', sa.Text(), nullable=False),
+    sa.Column('saved_at', sa.DateTime(), nullable=True),
+    sa.Column('submitted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_quiz_attempt_quiz_id'), ['quiz_id'], unique=False)
+        batch_op.create_index('ix_quiz_attempt_user_quiz', ['user_id', 'quiz_id', 'submitted_at'], unique=False)
+
+    op.create_table('score',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('total_questions', sa.Integer(), nullable=False),
+    sa.Column('percentage', sa.Float(), nullable=False),
+    sa.Column('time_stamp_of_attempt', sa.DateTime(), nullable=True),
+    sa.Column('submission_id', sa.String(length=32), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('score', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_score_quiz_id'), ['quiz_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_score_submission_id'), ['submission_id'], unique=True)
+        batch_op.create_index(batch_op.f('ix_score_time_stamp_of_attempt'), ['time_stamp_of_attempt'], unique=False)
+        batch_op.create_index('ix_score_user_quiz_time', ['user_id', 'quiz_id', 'time_stamp_of_attempt'], unique=False)
+        batch_op.create_index('ix_score_user_time', ['user_id', 'time_stamp_of_attempt'], unique=False)
+
+    op.create_table('answer',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('score_id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('selected_option', sa.Integer(), nullable=True),
+    sa.Column('is_correct', sa.Boolean(), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['question.id'], ),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.ForeignKeyConstraint(['score_id'], ['score.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('answer', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_answer_question_id'), ['question_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_answer_quiz_id'), ['quiz_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_answer_score_id'), ['score_id'], unique=False)
+
+
+
+def downgrade():
+    with op.batch_alter_table('answer', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_answer_score_id'))
+        batch_op.drop_index(batch_op.f('ix_answer_quiz_id'))
+        batch_op.drop_index(batch_op.f('ix_answer_question_id'))
+
+    op.drop_table('answer')
+    with op.batch_alter_table('score', schema=None) as batch_op:
+        batch_op.drop_index('ix_score_user_time')
+        batch_op.drop_index('ix_score_user_quiz_time')
+        batch_op.drop_index(batch_op.f('ix_score_time_stamp_of_attempt'))
+        batch_op.drop_index(batch_op.f('ix_score_submission_id'))
+        batch_op.drop_index(batch_op.f('ix_score_quiz_id'))
+
+    op.drop_table('score')
+    with op.batch_alter_table('quiz_attempt', schema=None) as batch_op:
+        batch_op.drop_index('ix_quiz_attempt_user_quiz')
+        batch_op.drop_index(batch_op.f('ix_quiz_attempt_quiz_id'))
+
+    op.drop_table('quiz_attempt')
+    with op.batch_alter_table('question', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_question_quiz_id'))
+
+    op.drop_table('question')
+    with op.batch_alter_table('quiz', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_quiz_chapter_id'))
+
+    op.drop_table('quiz')
+    op.drop_table('user_stats')
+    with op.batch_alter_table('leaderboard_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_leaderboard_entry_user_id'))
+
+    op.drop_table('leaderboard_entry')
+    with op.batch_alter_table('chapter', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_chapter_subject_id'))
+
+    op.drop_table('chapter')
+    op.drop_table('user')
+    op.drop_table('subject')
+    with op.batch_alter_table('job', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_job_status'))
+
+    op.drop_table('job')
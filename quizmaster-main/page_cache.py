@@ -0,0 +1,73 @@
+import hashlib
+from flask import get_template_attribute, render_template, session
+from markupsafe import Markup
+from cache import TTLCache, on_commit
+from database import Quiz, Question
+
+# Rendered quiz page pieces, keyed by quiz id and Quiz.revision.
+#
+# The question cards are identical for every student until an admin edits
+# the quiz, so they are rendered once per revision. The page around them gets
+# a strong ETag derived from the same revision, letting browsers revalidate
+# with If-None-Match and receive a 304 without anything being rendered.
+#
+# Attempts at a quiz with a question pool each show their own draw (see
+# pools.py). For those, every question is rendered once per revision, when it
+# is first drawn, and an attempt's page only strings its cards together.
+
+_question_fragments = TTLCache(maxsize=512, name='quiz_questions')
+_question_cards = TTLCache(maxsize=512, name='question_cards')  # quiz id -> (revision, {question id: html})
+
+def _render_cards(questions):
+    question_body = get_template_attribute('user/_quiz_question.html', 'question_body')
+    return {question.id: question_body(question) for question in questions}
+
+def render_quiz_questions(quiz, question_ids=None):
+    """HTML of the question cards of ``quiz``, rendered at most once per revision.
+
+    With ``question_ids`` (an attempt's draw), only those questions are shown,
+    in that order.
+    """
+    if question_ids is not None:
+        return _render_drawn_questions(quiz, question_ids)
+    cached = _question_fragments.get(quiz.id)
+    if cached is None or cached[0] != quiz.revision:
+        questions = Question.query.filter_by(quiz_id=quiz.id).order_by(Question.id).all()
+        cards = _render_cards(questions).values()
+        cached = (quiz.revision, Markup(render_template('user/_quiz_questions.html', cards=cards)))
+        _question_fragments.set(quiz.id, cached)
+    return cached[1]
+
+def _render_drawn_questions(quiz, question_ids):
+    cached = _question_cards.get(quiz.id)
+    if cached is None or cached[0] != quiz.revision:
+        cached = (quiz.revision, {})
+        _question_cards.set(quiz.id, cached)
+    cards = cached[1]
+    missing = [question_id for question_id in question_ids if question_id not in cards]
+    if missing:
+        cards.update(_render_cards(Question.query.filter(Question.quiz_id == quiz.id,
+                                                         Question.id.in_(missing))))
+    return Markup(render_template('user/_quiz_questions.html',
+                                  cards=[cards[question_id] for question_id in question_ids if question_id in cards]))
+
+def quiz_page_etag(quiz, user, attempt, saved_answers):
+    """Strong ETag for the quiz page as seen by ``user`` during ``attempt``.
+
+    The page also shows the chapter and subject names, the user's own navbar
+    and the attempt's deadline and saved answers, so those are part of the tag
+    alongside the quiz revision.
+    """
+    parts = (quiz.id, quiz.revision, quiz.chapter.name, quiz.chapter.subject.name, user.id, user.full_name,
+             attempt.id, attempt.deadline, saved_answers)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+def can_revalidate():
+    """False while flash messages are pending, since they must be rendered once."""
+    return not session.get('_flashes')
+
+@on_commit(Quiz)
+def _drop_question_fragments(changes):
+    for quiz_id in changes.get(Quiz, ()):
+        _question_fragments.pop(quiz_id)
+        _question_cards.pop(quiz_id)
@@ -0,0 +1,60 @@
+from flask import abort, current_app, request
+from sqlalchemy.engine import Row
+
+# Listing pagination shared by the admin and user pages.
+#
+# The first MAX_OFFSET_PAGES pages are numbered (LIMIT/OFFSET, with a total
+# count). Past that, and whenever an ``after`` cursor is given, pages are
+# fetched by seeking on an indexed key (``WHERE key > :after ORDER BY key``),
+# so a deep page costs the same as the first one. A page number past the cap
+# is never linked and is a 404 rather than quietly showing another page.
+# Ranked search results have no such key: they are numbered all the way (see
+# search.py).
+
+def page_args(capped=True):
+    """``(page, per_page, after)`` from the query string, within the configured bounds.
+
+    A page past MAX_OFFSET_PAGES aborts with 404 unless ``capped`` is False
+    or an ``after`` cursor is given (the page number is then unused).
+    """
+    config = current_app.config
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = request.args.get('per_page', config['PER_PAGE'], type=int)
+    per_page = min(max(per_page, 1), config['MAX_PER_PAGE'])
+    after = request.args.get('after', type=int)
+    if capped and after is None and page > config['MAX_OFFSET_PAGES']:
+        abort(404, f"Only the first {config['MAX_OFFSET_PAGES']} pages are numbered; use Next to go further.")
+    return page, per_page, after
+
+def _key_of(item, key_column):
+    obj = item[0] if isinstance(item, Row) else item
+    return getattr(obj, key_column.key)
+
+class KeysetPagination:
+    """One page of a seek (keyset) pagination, started after the key ``after``."""
+
+    keyset = True
+    total = None
+
+    def __init__(self, query, key_column, after, per_page):
+        rows = query.filter(key_column > after).order_by(None).order_by(key_column).limit(per_page + 1).all()
+        self.items = rows[:per_page]
+        self.per_page = per_page
+        self.after = after
+        self.has_next = len(rows) > per_page
+        self.next_after = _key_of(self.items[-1], key_column) if self.has_next else None
+
+    def __iter__(self):
+        return iter(self.items)
+
+def paginate_listing(query, key_column):
+    """Paginate ``query`` (already ordered by ``key_column``) from the request args."""
+    page, per_page, after = page_args()
+    if after is not None:
+        return KeysetPagination(query, key_column, after, per_page)
+
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination.keyset = False
+    pagination.next_after = (_key_of(pagination.items[-1], key_column)
+                             if pagination.has_next and pagination.items else None)
+    return pagination
@@ -0,0 +1,127 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing off the request threads, plus login throttling.
+#
+# Hashes are computed in a small process pool, so a burst of logins can only
+# ever use PASSWORD_HASH_WORKERS cores and the web workers keep serving every
+# other route. At most PASSWORD_HASH_MAX_PENDING hashes may be queued or
+# running; past that, callers get HashingBusy and answer 503 instead of
+# piling up; a hash holds its slot until it has actually run, or is cancelled
+# before starting. PASSWORD_HASH_WORKERS = 0 hashes inline (no pool).
+#
+# The pool's processes are started by a fork server: forking the web worker
+# itself, whose other threads may hold locks, could deadlock them.
+
+class HashingBusy(Exception):
+    """The hashing queue is full; the client should retry shortly."""
+
+_executor = None
+_pending = 0
+_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+                                            mp_context=multiprocessing.get_context('forkserver'))
+        return _executor
+
+def _release(future=None):
+    global _pending
+    with _lock:
+        _pending -= 1
+
+def _run(func, *args):
+    global _pending
+    config = current_app.config
+    if not config['PASSWORD_HASH_WORKERS']:
+        return func(*args)
+
+    with _lock:
+        if _pending >= config['PASSWORD_HASH_MAX_PENDING']:
+            raise HashingBusy()
+        _pending += 1
+    try:
+        future = _get_executor().submit(func, *args)
+    except BaseException:
+        _release()
+        raise
+    future.add_done_callback(_release)
+    try:
+        return future.result(timeout=config['PASSWORD_HASH_TIMEOUT'])
+    except TimeoutError:
+        future.cancel()  # Frees the slot at once if the hash has not started
+        raise HashingBusy()
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+def needs_rehash(pwhash):
+    """True if ``pwhash`` was made with other parameters than PASSWORD_HASH_METHOD."""
+    return pwhash.split('$', 1)[0] != current_app.config['PASSWORD_HASH_METHOD']
+
+def shutdown():
+    """Stop the pool; it is started again on the next hash."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor:
+        executor.shutdown()
+
+
+class Throttle:
+    """Fixed-window attempt counter per key (an IP address, an email...)."""
+
+    def __init__(self, limit, window, maxsize=10000):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self._windows = OrderedDict()  # key -> [window start, attempts]
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Count one attempt; return how many seconds to wait if over the limit, else 0."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or now - entry[0] >= self.window:
+                entry = self._windows[key] = [now, 0]
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.maxsize:
+                self._windows.popitem(last=False)
+            entry[1] += 1
+            if entry[1] > self.limit:
+                return max(int(entry[0] + self.window - now) + 1, 1)
+            return 0
+
+    def wait(self, key):
+        """Seconds to wait before ``key`` may try again (0 if it may), without counting an attempt."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._windows.get(key)
+            if entry is None or now - entry[0] >= self.window or entry[1] < self.limit:
+                return 0
+            return max(int(entry[0] + self.window - now) + 1, 1)
+
+    def reset(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+_throttles = {}
+
+def throttle(name):
+    """The shared Throttle configured by LOGIN_RATE_LIMITS[name] = (limit, window)."""
+    with _lock:
+        if name not in _throttles:
+            _throttles[name] = Throttle(*current_app.config['LOGIN_RATE_LIMITS'][name])
+        return _throttles[name]
@@ -0,0 +1,94 @@
+import random
+import secrets
+from array import array
+from cache import TTLCache, on_commit
+from database import db, Quiz, Question
+
+# Question pools: quizzes that draw Quiz.pool_size of their questions per attempt.
+#
+# The question ids of a quiz are cached per revision as compact arrays, one
+# for the whole pool and one per stratum (tag or difficulty value), so a draw
+# is random.sample over an in-memory array: O(pool_size), with no
+# ORDER BY RANDOM() over the question table. The draw is seeded per attempt
+# and the drawn ids are stored with the attempt (see attempts.py), so the
+# same attempt always shows, autosaves and grades the same questions.
+#
+# A stratified draw (Quiz.pool_strata) gives each stratum a share of the draw
+# proportional to its size, the largest remainders rounding up: a pool that is
+# 60% easy questions yields quizzes that are about 60% easy. Questions with no
+# tag or difficulty form a stratum of their own. Drawn questions are shown in
+# a shuffled order.
+
+STRATA = ('tag', 'difficulty')
+DIFFICULTIES = ('easy', 'medium', 'hard')
+
+_pools = TTLCache(maxsize=2048, name='question_pools')
+
+class QuestionPool:
+    __slots__ = ('revision', 'question_ids', 'strata')
+
+    def __init__(self, revision, rows):
+        self.revision = revision
+        self.question_ids = array('l', (row[0] for row in rows))
+        self.strata = {name: {} for name in STRATA}  # name -> value -> ids
+        for question_id, *values in rows:
+            for name, value in zip(STRATA, values):
+                ids = self.strata[name].get(value)
+                if ids is None:
+                    ids = self.strata[name][value] = array('l')
+                ids.append(question_id)
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def draw(self, size, seed, strata=None):
+        """``size`` question ids drawn with ``seed``, optionally per stratum, in shuffled order."""
+        rng = random.Random(seed)
+        if size >= len(self.question_ids):
+            drawn = list(self.question_ids)
+        elif strata is None:
+            return rng.sample(self.question_ids, size)  # Already in random order
+        else:
+            drawn = []
+            for ids, count in _allocate(self.strata[strata], size, len(self.question_ids)):
+                drawn += rng.sample(ids, count)
+        rng.shuffle(drawn)
+        return drawn
+
+def _allocate(strata, size, total):
+    """``(ids, count)`` per stratum: ``size`` split in proportion to the stratum sizes."""
+    # Sorted, so that a seed draws the same questions in every process
+    groups = sorted(strata.items(), key=lambda item: (item[0] is not None, item[0] or ''))
+    shares = [size * len(ids) / total for _, ids in groups]
+    counts = [int(share) for share in shares]
+    by_remainder = sorted(range(len(groups)), key=lambda i: counts[i] - shares[i])
+    for i in by_remainder[:size - sum(counts)]:
+        counts[i] += 1
+    return [(ids, count) for (_, ids), count in zip(groups, counts) if count]
+
+def get_pool(quiz):
+    """Return the QuestionPool of ``quiz``, loading it only if its revision changed."""
+    pool = _pools.get(quiz.id)
+    if pool is None or pool.revision != quiz.revision:
+        rows = db.session.execute(
+            db.select(Question.id, Question.tag, Question.difficulty)
+            .where(Question.quiz_id == quiz.id)
+            .order_by(Question.id)
+        ).all()
+        pool = QuestionPool(quiz.revision, rows)
+        _pools.set(quiz.id, pool)
+    return pool
+
+def new_seed():
+    return secrets.randbits(31)
+
+def draw_questions(quiz, seed):
+    """The ids an attempt seeded with ``seed`` gets, or None if ``quiz`` has no pool."""
+    if not quiz.pool_size:
+        return None
+    return get_pool(quiz).draw(quiz.pool_size, seed, quiz.pool_strata or None)
+
+@on_commit(Quiz)
+def _drop_pools(changes):
+    for quiz_id in changes.get(Quiz, ()):
+        _pools.pop(quiz_id)
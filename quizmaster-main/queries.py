@@ -0,0 +1,74 @@
+from contextlib import contextmanager
+from sqlalchemy import event, func
+from sqlalchemy.orm import joinedload
+from database import db, Subject, Chapter, Quiz, Question
+
+# Shared query layer for the admin list pages.
+# Each helper returns a query of (object, child_count) rows so the templates
+# never touch a lazy relationship while rendering a table.
+
+def _child_counts(fk_column, id_column):
+    """Grouped COUNT(*) of child rows keyed by their parent id."""
+    return (
+        db.session.query(fk_column.label('parent_id'), func.count(id_column).label('total'))
+        .group_by(fk_column)
+        .subquery()
+    )
+
+def subjects_with_counts():
+    """Subjects with their number of chapters."""
+    counts = _child_counts(Chapter.subject_id, Chapter.id)
+    return (
+        db.session.query(Subject, func.coalesce(counts.c.total, 0))
+        .outerjoin(counts, counts.c.parent_id == Subject.id)
+        .order_by(Subject.id)
+    )
+
+def chapters_with_counts():
+    """Chapters (with their subject) and their number of quizzes."""
+    counts = _child_counts(Quiz.chapter_id, Quiz.id)
+    return (
+        db.session.query(Chapter, func.coalesce(counts.c.total, 0))
+        .options(joinedload(Chapter.subject))
+        .outerjoin(counts, counts.c.parent_id == Chapter.id)
+        .order_by(Chapter.id)
+    )
+
+def quizzes_with_counts():
+    """Quizzes (with chapter and subject) and their number of questions."""
+    counts = _child_counts(Question.quiz_id, Question.id)
+    return (
+        db.session.query(Quiz, func.coalesce(counts.c.total, 0))
+        .options(joinedload(Quiz.chapter).joinedload(Chapter.subject))
+        .outerjoin(counts, counts.c.parent_id == Quiz.id)
+        .order_by(Quiz.id)
+    )
+
+@contextmanager
+def count_queries():
+    """Record every SQL statement sent to the database inside the block.
+
+    Yields a list that fills up with the executed statements, so
+    ``len(statements)`` is the query count once the block exits.
+    """
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', _record)
+
+def explain_query_plan(statement):
+    """Detail lines of SQLite's ``EXPLAIN QUERY PLAN`` for a Core/ORM select."""
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(db.text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    return [row[-1] for row in rows]
+
+def is_full_scan(detail):
+    """True for plan steps that read a whole table instead of using an index."""
+    return detail.startswith('SCAN ') and ' INDEX ' not in detail
@@ -1,9 +1,28 @@
-from flask import jsonify,Blueprint, render_template, redirect, url_for, flash, request, abort
+import json
+import os
+import uuid
+from flask import jsonify,Blueprint, render_template, redirect, url_for, flash, request, abort, make_response, Response, stream_with_context, current_app, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from database import db, User, Subject, Chapter, Quiz, Question, Score
-from forms import LoginForm, RegistrationForm, SubjectForm, ChapterForm, QuizForm, QuestionForm
-from datetime import datetime
+from database import db, User, Subject, Chapter, Quiz, Question, Score, UserStats, Job
+from forms import LoginForm, RegistrationForm, SubjectForm, ChapterForm, QuizForm, QuestionForm, QuestionImportForm
+from catalogue import get_catalogue
+from queries import subjects_with_counts, chapters_with_counts, quizzes_with_counts
+from stats import get_dashboard_stats
+from search import search_quizzes
+from pagination import page_args, paginate_listing
+from page_cache import render_quiz_questions, quiz_page_etag, can_revalidate
+from ingest import score_ingestor
+from cache import caches
+from metrics import metrics
+from exports import EXPORT_FORMATS, available_formats, export_questions, export_results, gzip_chunks
+import importer
+import analytics
+import leaderboard
+import attempts
+from jobs import jobs, DONE, FAILED, RUNNING, QUEUED
+from passwords import HashingBusy, hash_password, verify_password, needs_rehash, throttle
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
 
 # Create blueprints for different sections of the app
 main_bp = Blueprint('main', __name__)  # Main routes
@@ -29,11 +48,30 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        # Throttle guessing per account, and per client address on failed attempts
+        # only: a classroom behind one NAT shares an address
+        email = form.email.data.strip().lower()
+        retry_after = max(throttle('ip').wait(request.remote_addr), throttle('email').hit(email))
+        if retry_after:
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('auth/login.html', form=form), 429, {'Retry-After': str(retry_after)}
+
         user = User.query.filter_by(email=form.email.data).first()
-        if not user or not check_password_hash(user.password, form.password.data):
+        try:
+            valid = user is not None and verify_password(user.password, form.password.data)
+            if valid and needs_rehash(user.password):
+                user.password = hash_password(form.password.data)
+                db.session.commit()
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('auth/login.html', form=form), 503, {'Retry-After': '1'}
+
+        if not valid:
+            throttle('ip').hit(request.remote_addr)
             flash('Invalid email or password.', 'danger')
             return render_template('auth/login.html', form=form)
 
+        throttle('email').reset(email)
         login_user(user)
         
         # Check if user is admin or regular user
@@ -53,11 +91,17 @@ def register():
     
     form = RegistrationForm()
     if form.validate_on_submit():
+        try:
+            password_hash = hash_password(form.password.data)
+        except HashingBusy:
+            flash('The server is busy. Please try again in a moment.', 'warning')
+            return render_template('auth/register.html', form=form), 503, {'Retry-After': '1'}
+
         # Create a new user
         new_user = User(
             username=form.username.data,  # Add username
             email=form.email.data,
-            password=generate_password_hash(form.password.data),
+            password=password_hash,
             full_name=form.full_name.data,
             qualification=form.qualification.data,
             dob=form.dob.data,
@@ -85,30 +129,64 @@ def dashboard():
     if not current_user.is_admin:
         abort(403)  # Forbidden access
     
-    # Fetch statistics
-    stats = {
-        'total_users': User.query.filter_by(is_admin=False).count(),
-        'total_subjects': Subject.query.count(),
-        'total_chapters': Chapter.query.count(),
-        'total_quizzes': Quiz.query.count(),
-        'quizzes_attempted': Score.query.count(),
-    }
+    # Fetch statistics and recent quiz attempts (cached, see stats.py)
+    stats, recent_scores = get_dashboard_stats()
     
-    # Fetch recent quiz attempts
-    recent_scores = Score.query.order_by(Score.time_stamp_of_attempt.desc()).limit(10).all()
-    
-    # Fetch a quiz (if needed)
-    quiz = Quiz.query.first()  # Fetch the first quiz for demonstration
-    
-    # If no quiz exists, set quiz to None
-    if not quiz:
+    if not stats['total_quizzes']:
         flash('No quizzes found. Please create a quiz first.', 'warning')
-        quiz = None  # Set quiz to None to avoid errors in the template
     
     return render_template('admin/dashboard.html', 
                            stats=stats,
                            recent_scores=recent_scores,
-                           quiz=quiz)  # Pass the quiz variable
+                           export_formats=available_formats())
+
+def flash_job(job, done_message, description):
+    """Flash how a job ended, or that it is still running in the background (see jobs.py)."""
+    if job.status == DONE:
+        flash(done_message, 'success')
+    elif job.status == FAILED:
+        flash(f'{description} failed: {job.error}', 'danger')
+    else:
+        flash(f'{description} in the background (job #{job.id}); see Background Jobs for its progress.', 'info')
+
+# In-process cache sizes and hit/miss counters, for sizing the caches
+@admin_bp.route('/cache-stats')
+@login_required
+def cache_stats():
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify({name: cache.stats() for name, cache in caches.items()})
+
+# Request metrics in Prometheus text format (see metrics.py)
+@admin_bp.route('/metrics')
+@login_required
+def metrics_text():
+    if not current_user.is_admin:
+        abort(403)
+    return Response(metrics.prometheus_text(), mimetype='text/plain; version=0.0.4')
+
+# Score statistics for the dashboard chart (see analytics.py)
+@admin_bp.route('/analytics/overview')
+@login_required
+def analytics_overview():
+    if not current_user.is_admin:
+        abort(403)
+    result = analytics.overview()
+    if result is None:
+        return jsonify({'error': 'Analytics need numpy installed.'}), 501
+    return jsonify(result)
+
+# Item analysis of one quiz: difficulty and discrimination of each question
+@admin_bp.route('/analytics/quiz/<int:quiz_id>')
+@login_required
+def analytics_quiz(quiz_id):
+    if not current_user.is_admin:
+        abort(403)
+    result = analytics.quiz_analysis(Quiz.query.get_or_404(quiz_id))
+    if result is None:
+        return jsonify({'error': 'Analytics need numpy installed.'}), 501
+    return jsonify(result)
+
 # Subject management route: Allows admins to manage subjects
 @admin_bp.route('/subjects', methods=['GET', 'POST'])
 @login_required
@@ -129,8 +207,8 @@ def manage_subjects():
         flash('Subject added successfully!', 'success')
         return redirect(url_for('admin.manage_subjects'))
     
-    # Display all subjects
-    subjects = Subject.query.all()
+    # Display one page of subjects with their chapter counts
+    subjects = paginate_listing(subjects_with_counts(), Subject.id)
     return render_template('admin/subjects.html', subjects=subjects, form=form)
 @admin_bp.route('/edit_subject/<int:subject_id>', methods=['GET', 'POST'])
 @login_required
@@ -157,10 +235,10 @@ def delete_subject(subject_id):
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    subject = Subject.query.get_or_404(subject_id)  # Get the subject
-    db.session.delete(subject)  # Delete the subject
-    db.session.commit()  # Save changes to the database
-    flash('Subject deleted successfully!', 'success')
+    Subject.query.get_or_404(subject_id)  # Make sure the subject exists
+    # Bulk delete it and everything under it in the background (see jobs.py and deletion.py)
+    job = jobs.enqueue('delete_subjects', created_by=current_user.id, subject_ids=[subject_id])
+    flash_job(job, 'Subject deleted successfully!', 'Deleting the subject')
     return redirect(url_for('admin.manage_subjects'))
 
 # Chapter management route: Allows admins to manage chapters
@@ -173,9 +251,8 @@ def manage_chapters():
     
     form = ChapterForm()
     
-    # Fetch all subjects for the dropdown
-    subjects = Subject.query.all()
-    form.subject_id.choices = [(subject.id, subject.name) for subject in subjects]
+    # Subjects for the dropdown and filter, from the in-memory catalogue (see catalogue.py)
+    subjects = get_catalogue().subjects
     
     if form.validate_on_submit():
         # Create a new chapter
@@ -189,11 +266,8 @@ def manage_chapters():
         flash('Chapter added successfully!', 'success')
         return redirect(url_for('admin.manage_chapters'))
     
-    # Fetch all chapters for display
-    chapters = Chapter.query.all()
-    
-    # Debug: Print all subjects to the console
-    print(f"Subjects: {subjects}")
+    # Fetch one page of chapters (with subject and quiz counts) for display
+    chapters = paginate_listing(chapters_with_counts(), Chapter.id)
     
     return render_template('admin/chapters.html', chapters=chapters, form=form, subjects=subjects)
 @admin_bp.route('/add_chapter', methods=['POST'])
@@ -203,8 +277,7 @@ def add_chapter():
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    form = ChapterForm()
-    form.subject_id.choices = [(s.id, s.name) for s in Subject.query.all()]  # Populate subject dropdown
+    form = ChapterForm()  # Subject dropdown filled from the catalogue
     
     if form.validate_on_submit():
         # Create a new chapter
@@ -229,8 +302,7 @@ def edit_chapter(chapter_id):
         return redirect(url_for('user.dashboard'))
 
     chapter = Chapter.query.get_or_404(chapter_id)
-    form = ChapterForm(obj=chapter)
-    form.subject_id.choices = [(s.id, s.name) for s in Subject.query.all()]  # Populate subject dropdown
+    form = ChapterForm(obj=chapter)  # Subject dropdown filled from the catalogue
 
     if form.validate_on_submit():
         form.populate_obj(chapter)
@@ -247,10 +319,10 @@ def delete_chapter(chapter_id):
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    chapter = Chapter.query.get_or_404(chapter_id)  # Get the chapter
-    db.session.delete(chapter)  # Delete the chapter
-    db.session.commit()  # Save changes to the database
-    flash('Chapter deleted successfully!', 'success')
+    Chapter.query.get_or_404(chapter_id)  # Make sure the chapter exists
+    # Bulk delete it and everything under it in the background (see jobs.py and deletion.py)
+    job = jobs.enqueue('delete_chapters', created_by=current_user.id, chapter_ids=[chapter_id])
+    flash_job(job, 'Chapter deleted successfully!', 'Deleting the chapter')
     return redirect(url_for('admin.manage_chapters'))
 
 # Quiz management route: Allows admins to manage quizzes
@@ -263,9 +335,8 @@ def manage_quizzes():
     
     form = QuizForm()
     
-    # Fetch all subjects for the dropdown
-    subjects = Subject.query.all()
-    form.subject_id.choices = [(subject.id, subject.name) for subject in subjects]  # Populate subject_id choices
+    # Subjects for the dropdowns and filter, from the in-memory catalogue (see catalogue.py)
+    subjects = get_catalogue().subjects
     
     if form.validate_on_submit():
         # Create a new quiz
@@ -274,29 +345,45 @@ def manage_quizzes():
             chapter_id=form.chapter_id.data,
             date_of_quiz=form.date_of_quiz.data,
             time_duration=form.duration.data,
-            remarks=form.remarks.data
+            remarks=form.remarks.data,
+            pool_size=form.pool_size.data,
+            pool_strata=form.pool_strata.data or None
         )
         db.session.add(new_quiz)
         db.session.commit()
         flash('Quiz added successfully!', 'success')
         return redirect(url_for('admin.manage_quizzes'))
     
-    # Fetch all quizzes for display
-    quizzes = Quiz.query.all()
-    
-    subjects = Subject.query.all()
+    # Fetch one page of quizzes (with chapter, subject and question counts) for display
+    quizzes = paginate_listing(quizzes_with_counts(), Quiz.id)
     
     return render_template('admin/quizzes.html', quizzes=quizzes, form=form, subjects=subjects)
 
 @admin_bp.route('/get_chapters', methods=['GET'])
 @login_required
 def get_chapters():
-    subject_id = request.args.get('subject_id')
+    subject_id = request.args.get('subject_id', type=int)
     if not subject_id:
         return jsonify({"error": "Subject ID is required"}), 400
 
-    chapters = Chapter.query.filter_by(subject_id=subject_id).all()
-    return jsonify([{'id': chapter.id, 'name': chapter.name} for chapter in chapters])
+    chapters = get_catalogue().chapter_choices(subject_id)  # In memory, see catalogue.py
+    return jsonify([{'id': chapter_id, 'name': name} for chapter_id, name in chapters])
+
+# The whole subject -> chapter tree for the chapter pickers, revalidated by ETag
+@admin_bp.route('/catalogue')
+@login_required
+def catalogue_json():
+    if not current_user.is_admin:
+        abort(403)
+    catalogue = get_catalogue()
+    if catalogue.etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(catalogue.body)
+        response.mimetype = 'application/json'
+    response.set_etag(catalogue.etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @admin_bp.route('/add_quiz', methods=['GET', 'POST'])
 @login_required
@@ -305,11 +392,7 @@ def add_quiz():
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
     
-    form = QuizForm()
-    
-    # Populate subject and chapter dropdowns
-    form.subject_id.choices = [(s.id, s.name) for s in Subject.query.all()]
-    form.chapter_id.choices = [(c.id, c.name) for c in Chapter.query.all()]
+    form = QuizForm()  # Subject and chapter dropdowns filled from the catalogue
     
     if request.method == 'POST':
         if form.validate_on_submit():
@@ -319,7 +402,9 @@ def add_quiz():
                 chapter_id=form.chapter_id.data,
                 date_of_quiz=form.date_of_quiz.data,
                 time_duration=form.duration.data,
-                remarks=form.remarks.data
+                remarks=form.remarks.data,
+                pool_size=form.pool_size.data,
+                pool_strata=form.pool_strata.data or None
             )
             db.session.add(new_quiz)
             db.session.commit()
@@ -343,11 +428,11 @@ def edit_quiz(quiz_id):
         return redirect(url_for('user.dashboard'))
 
     quiz = Quiz.query.get_or_404(quiz_id)
-    form = QuizForm(obj=quiz)
-    form.chapter_id.choices = [(c.id, c.name) for c in Chapter.query.all()]  # Populate chapter dropdown
+    form = QuizForm(obj=quiz)  # Chapter dropdown filled from the catalogue
 
     if form.validate_on_submit():
         form.populate_obj(quiz)
+        quiz.pool_strata = form.pool_strata.data or None
         db.session.commit()
         flash('Quiz updated successfully!', 'success')
         return redirect(url_for('admin.manage_quizzes'))
@@ -361,10 +446,10 @@ def delete_quiz(quiz_id):
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    quiz = Quiz.query.get_or_404(quiz_id)  # Get the quiz
-    db.session.delete(quiz)  # Delete the quiz
-    db.session.commit()  # Save changes to the database
-    flash('Quiz deleted successfully!', 'success')
+    Quiz.query.get_or_404(quiz_id)  # Make sure the quiz exists
+    # Bulk delete it and everything under it in the background (see jobs.py and deletion.py)
+    job = jobs.enqueue('delete_quizzes', created_by=current_user.id, quiz_ids=[quiz_id])
+    flash_job(job, 'Quiz deleted successfully!', 'Deleting the quiz')
     return redirect(url_for('admin.manage_quizzes'))
 
 @admin_bp.route('/questions/<int:quiz_id>', methods=['GET', 'POST'])
@@ -374,10 +459,13 @@ def manage_questions(quiz_id):
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    quiz = Quiz.query.options(joinedload(Quiz.chapter).joinedload(Chapter.subject)).get_or_404(quiz_id)
+    questions = paginate_listing(Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id), Question.id)
     form = QuestionForm()  
-    return render_template('admin/questions.html', quiz=quiz, questions=questions, form=form)
+    import_form = QuestionImportForm()
+    analysis = analytics.quiz_analysis(quiz)
+    return render_template('admin/questions.html', quiz=quiz, questions=questions, form=form,
+                           import_form=import_form, analysis=analysis)
 # Route to add a new question to a quiz
 @admin_bp.route('/add_question/<int:quiz_id>', methods=['POST'])
 @login_required
@@ -397,7 +485,9 @@ def add_question(quiz_id):
                 option2=form.option2.data,
                 option3=form.option3.data,
                 option4=form.option4.data,
-                correct_option=int(form.correct_option.data)
+                correct_option=int(form.correct_option.data),
+                tag=form.tag.data or None,
+                difficulty=form.difficulty.data or None
             )
             db.session.add(new_question)
             db.session.commit()
@@ -412,6 +502,107 @@ def add_question(quiz_id):
                 flash(f"Error in {field}: {error}", 'danger')
     
     return redirect(url_for('admin.manage_questions', quiz_id=quiz_id))
+# Route to import questions in bulk from a CSV or JSON-lines file
+@admin_bp.route('/import_questions/<int:quiz_id>', methods=['POST'])
+@login_required
+def import_questions(quiz_id):
+    if not current_user.is_admin:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('user.dashboard'))
+
+    Quiz.query.get_or_404(quiz_id)  # Make sure the quiz exists
+    form = QuestionImportForm()
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            fmt = importer.detect_format(upload.filename)
+        except importer.ImportFileError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('admin.manage_questions', quiz_id=quiz_id))
+
+        # Keep the upload for the background job, which removes it when done (see jobs.py)
+        directory = os.path.join(current_app.instance_path, 'uploads')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{uuid.uuid4().hex}.{fmt}')
+        upload.save(path)
+        job = jobs.enqueue('import_questions', created_by=current_user.id, quiz_id=quiz_id, path=path, fmt=fmt)
+        if job.status == DONE:
+            flash_import_result(json.loads(job.result))
+        else:
+            flash_job(job, None, 'Importing the questions')
+    else:
+        for field, errors in form.errors.items():
+            for error in errors:
+                flash(f"Error in {field}: {error}", 'danger')
+
+    return redirect(url_for('admin.manage_questions', quiz_id=quiz_id))
+
+def flash_import_result(result):
+    flash(f"Imported {result['imported']} question(s).", 'success' if result['imported'] else 'warning')
+    if result['error_count']:
+        shown = '; '.join(f'line {line}: {message}' for line, message in result['errors'])
+        more = f" (and {result['error_count'] - 10} more)" if result['error_count'] > 10 else ''
+        flash(f"Skipped {result['error_count']} invalid row(s): {shown}{more}", 'danger')
+
+# Route to download a quiz's questions (streamed, CSV or JSON-lines)
+@admin_bp.route('/export/<int:quiz_id>/questions')
+@login_required
+def export_questions_file(quiz_id):
+    if not current_user.is_admin:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('user.dashboard'))
+
+    quiz = Quiz.query.get_or_404(quiz_id)
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        abort(400)
+    return Response(stream_with_context(export_questions(quiz.id, fmt)), mimetype=EXPORT_FORMATS[fmt],
+                    headers={'Content-Disposition': f'attachment; filename=quiz-{quiz.id}-questions.{fmt}'})
+
+# Route to download quiz attempts, filtered by subject, chapter, quiz and date range
+@admin_bp.route('/export/results')
+@login_required
+def export_results_file():
+    if not current_user.is_admin:
+        flash('Unauthorized access.', 'danger')
+        return redirect(url_for('user.dashboard'))
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in available_formats():
+        abort(400, description=f"format must be one of {', '.join(available_formats())}")
+    try:
+        date_from = request.args.get('date_from')
+        date_to = request.args.get('date_to')
+        filters = {
+            'subject_id': request.args.get('subject_id', type=int),
+            'chapter_id': request.args.get('chapter_id', type=int),
+            'quiz_id': request.args.get('quiz_id', type=int),
+            'date_from': datetime.strptime(date_from, '%Y-%m-%d') if date_from else None,
+            # Inclusive end date: everything before the following midnight
+            'date_to': datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1) if date_to else None,
+        }
+    except ValueError:
+        abort(400, description='Dates must be in YYYY-MM-DD format.')
+
+    if request.args.get('background'):
+        # Written to a file by a background job, downloaded from the jobs page (see jobs.py)
+        for name in ('date_from', 'date_to'):
+            filters[name] = filters[name].isoformat() if filters[name] else None
+        job = jobs.enqueue('export_results', created_by=current_user.id, fmt=fmt,
+                           compress=request.args.get('compress') == 'gzip' and fmt != 'parquet', **filters)
+        flash_job(job, 'The export is ready to download.', 'Exporting the attempts')
+        return redirect(url_for('admin.job_list'))
+
+    chunks = export_results(fmt, **filters)
+    filename = f'results.{fmt}'
+    mimetype = EXPORT_FORMATS[fmt]
+    if request.args.get('compress') == 'gzip' and fmt != 'parquet':
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
 # Route to edit an existing question
 @admin_bp.route('/edit_question/<int:quiz_id>', methods=['POST'])
 @login_required
@@ -422,16 +613,18 @@ def edit_question(quiz_id):
 
     form = QuestionForm()
     if form.validate_on_submit():
-        question_id = request.form.get('question_id')
-        question = Question.query.get_or_404(question_id)
+        question_id = request.form.get('question_id', type=int)
+        question = Question.query.filter_by(id=question_id, quiz_id=quiz_id).first_or_404()
         
         # Update the question
-        question.question_statement = form.question_text.data
+        question.question_text = form.question_text.data
         question.option1 = form.option1.data
         question.option2 = form.option2.data
         question.option3 = form.option3.data
         question.option4 = form.option4.data
         question.correct_option = int(form.correct_option.data)
+        question.tag = form.tag.data or None
+        question.difficulty = form.difficulty.data or None
         
         db.session.commit()
         flash('Question updated successfully!', 'success')
@@ -448,8 +641,8 @@ def delete_question(quiz_id):
         flash('Unauthorized access.', 'danger')
         return redirect(url_for('user.dashboard'))
 
-    question_id = request.form.get('question_id')
-    question = Question.query.get_or_404(question_id)
+    question_id = request.form.get('question_id', type=int)
+    question = Question.query.filter_by(id=question_id, quiz_id=quiz_id).first_or_404()
     
     db.session.delete(question)
     db.session.commit()
@@ -465,37 +658,31 @@ def dashboard():
     subject_search = request.args.get('subject_search', '').strip()
     quiz_search = request.args.get('quiz_search', '').strip()
 
-    # Base queries
-    quiz_query = Quiz.query.join(Chapter).join(Subject)
-    subject_query = Subject.query
-
-    # Apply filters if search terms exist
-    if subject_search:
-        subject_query = subject_query.filter(
-            Subject.name.ilike(f'%{subject_search}%')
-        )
-        quiz_query = quiz_query.filter(
-            Subject.name.ilike(f'%{subject_search}%')
-        )
-
-    if quiz_search:
-        quiz_query = quiz_query.filter(
-            Quiz.title.ilike(f'%{quiz_search}%')
-        )
-
-    # Get filtered results
-    subjects = subject_query.all()
-    quizzes = quiz_query.all()
-
-    # Get user scores and stats
-    user_scores = Score.query.filter_by(user_id=current_user.id).all()
-    total_attempts = len(user_scores)
-    average_score = sum(s.score / s.total_questions * 100 for s in user_scores) / total_attempts if total_attempts else 0
+    # Ranked full-text search when search terms exist (see search.py)
+    if subject_search or quiz_search:
+        page, per_page, _ = page_args(capped=False)
+        results = search_quizzes(subject_search, quiz_search, page=page, per_page=per_page)
+    else:
+        results = paginate_listing(
+            Quiz.query.options(joinedload(Quiz.chapter).joinedload(Chapter.subject)).order_by(Quiz.id),
+            Quiz.id)
+    quizzes = results.items
+    total_results = results.total
+
+    # Get user stats from the summary row and the most recent attempts
+    user_stats = db.session.get(UserStats, current_user.id)
+    total_attempts = user_stats.attempt_count if user_stats else 0
+    average_score = user_stats.average_percentage if user_stats else 0
+    recent_scores = (Score.query.options(joinedload(Score.quiz))
+                     .filter_by(user_id=current_user.id)
+                     .order_by(Score.time_stamp_of_attempt.desc())
+                     .limit(5).all())
 
     return render_template('user/dashboard.html',
                          quizzes=quizzes,
-                         subjects=subjects,
-                         scores=user_scores,
+                         results=results,
+                         total_results=total_results,
+                         scores=recent_scores,
                          total_attempts=total_attempts,
                          average_score=average_score)
 # Quiz attempt route: Allows users to attempt a quiz
@@ -505,35 +692,76 @@ def attempt_quiz(quiz_id):
     if current_user.is_admin:
         return redirect(url_for('admin.dashboard'))
     
-    quiz = Quiz.query.get_or_404(quiz_id)
-    questions = Question.query.filter_by(quiz_id=quiz_id).all()
+    quiz = Quiz.query.options(joinedload(Quiz.chapter).joinedload(Chapter.subject)).get_or_404(quiz_id)
     
     if request.method == 'POST':
-        score = 0
-        for question in questions:
-            user_answer = request.form.get(f'question_{question.id}')
-            if user_answer and int(user_answer) == question.correct_option:
-                score += 1
+        attempt = attempts.open_attempt(current_user.id, quiz_id)
+        if attempt is None:
+            flash('This attempt was already submitted.', 'warning')
+            return redirect(url_for('user.quiz_results', quiz_id=quiz_id))
         
-        new_score = Score(
-            user_id=current_user.id,
-            quiz_id=quiz_id,
-            score=score,
-            total_questions=len(questions),
-            percentage=(score/len(questions))*100 if questions else 0
-        )
-        db.session.add(new_score)
-        db.session.commit()
+        # Grade the attempt's questions against the cached answer key (see
+        # grading.py); past the deadline only the answers autosaved in time
+        # count (see attempts.py).
+        # The score is journaled now and committed in the next batch (see ingest.py)
+        selected = attempts.answer_key(attempt, quiz).selected_options(request.form)
+        try:
+            _, late = attempts.submit_attempt(attempt, quiz, selected)
+        except attempts.AttemptClosed:
+            flash('This attempt was already submitted.', 'warning')
+            return redirect(url_for('user.quiz_results', quiz_id=quiz_id))
         
-        flash('Quiz submitted successfully!', 'success')
+        if late:
+            flash('Time was up: only the answers saved before the deadline were graded.', 'warning')
+        else:
+            flash('Quiz submitted successfully!', 'success')
+        return redirect(url_for('user.quiz_results', quiz_id=quiz_id))
+    
+    # Start the attempt (or resume the open one) with its server-side deadline
+    attempt, expired = attempts.start_attempt(current_user.id, quiz)
+    if expired:
+        flash('Your previous attempt ran out of time and was graded with its saved answers.', 'warning')
         return redirect(url_for('user.quiz_results', quiz_id=quiz_id))
+    saved_answers = attempts.saved_answers(attempt)
     
-    return render_template('user/quiz.html', quiz=quiz, questions=questions)
+    # Conditional GET: an unchanged page is answered with 304 before rendering anything
+    etag = quiz_page_etag(quiz, current_user, attempt, saved_answers)
+    if can_revalidate() and etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(render_template('user/quiz.html', quiz=quiz, attempt=attempt,
+                                                 saved_answers=saved_answers,
+                                                 questions_html=render_quiz_questions(
+                                                     quiz, attempts.question_ids(attempt))))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+# Leaderboard of a quiz or subject: top places and the current user's rank
+@user_bp.route('/leaderboard/<any(quiz, subject):board>/<int:board_id>')
+@login_required
+def leaderboard_json(board, board_id):
+    (Quiz if board == leaderboard.QUIZ else Subject).query.get_or_404(board_id)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), current_app.config['LEADERBOARD_MAX_LIMIT'])
+    top, mine, size = leaderboard.standings(board, board_id, current_user.id, limit)
+
+    names = dict(db.session.execute(
+        db.select(User.id, User.username).where(User.id.in_([user_id for _, user_id, _ in top]))
+    ).all()) if top else {}
+    return jsonify({
+        'board': board,
+        'id': board_id,
+        'entries': size,
+        'top': [{'rank': rank, 'user_id': user_id, 'username': names.get(user_id), 'points': points}
+                for rank, user_id, points in top],
+        'me': {'rank': mine[0], 'points': mine[1]} if mine else None,
+    })
+
 @user_bp.route('/quiz/<int:quiz_id>/results')
 @login_required
 def quiz_results(quiz_id):
     quiz = Quiz.query.get_or_404(quiz_id)
-    score = Score.query.filter_by(
+    # A just-submitted score may still be queued for writing
+    score = score_ingestor.pending_score(current_user.id, quiz_id) or Score.query.filter_by(
         user_id=current_user.id,
         quiz_id=quiz_id
     ).order_by(Score.time_stamp_of_attempt.desc()).first()
@@ -551,10 +779,7 @@ def manage_users():
     
     
     search_query = request.args.get('search', '').strip()
-    page = request.args.get('page', 1, type=int)
-    per_page = 10  # Users per page
 
-    
     users_query = User.query.filter_by(is_admin=False)
     
     # Apply search filter if query exists 
@@ -566,7 +791,7 @@ def manage_users():
         )
     
     # Paginate the results
-    users = users_query.order_by(User.id.asc()).paginate(page=page, per_page=per_page)
+    users = paginate_listing(users_query.order_by(User.id.asc()), User.id)
     
     return render_template('admin/users.html', 
                          users=users,
@@ -585,16 +810,52 @@ def delete_user(user_id):
         flash('Cannot delete admin users.', 'danger')
         return redirect(url_for('admin.manage_users'))
     
-    try:
-        # Delete all related scores first
-        Score.query.filter_by(user_id=user_id).delete()
-        
-        # Now delete the user
-        db.session.delete(user)
-        db.session.commit()
-        flash('User deleted successfully.', 'success')
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error deleting user: {str(e)}', 'danger')
+    # Delete the user with their answers, scores, attempts and standings, in
+    # the background (see jobs.py and deletion.py)
+    job = jobs.enqueue('delete_user', created_by=current_user.id, user_id=user_id)
+    flash_job(job, 'User deleted successfully.', 'Deleting the user')
     
-    return redirect(url_for('admin.manage_users'))    
\ No newline at end of file
+    return redirect(url_for('admin.manage_users'))    
+
+# Background jobs (see jobs.py): the latest ones, and one job's status for polling
+@admin_bp.route('/jobs')
+@login_required
+def job_list():
+    if not current_user.is_admin:
+        flash('Access restricted to administrators only.', 'danger')
+        return redirect(url_for('user.dashboard'))
+
+    recent = Job.query.order_by(Job.id.desc()).limit(50).all()
+    return render_template('admin/jobs.html', jobs=[jobs.status(job) for job in recent],
+                           active=(QUEUED, RUNNING))
+
+@admin_bp.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    if not current_user.is_admin:
+        abort(403)
+    return jsonify(jobs.status(db.get_or_404(Job, job_id)))
+
+@admin_bp.route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    if not current_user.is_admin:
+        abort(403)
+    job = db.get_or_404(Job, job_id)
+    if job.kind != 'export_results' or job.status != DONE:
+        abort(404)
+    return send_from_directory(os.path.join(current_app.instance_path, 'exports'), json.loads(job.result)['filename'],
+                               as_attachment=True)
+
+# Recompute a derived table from the Score and Quiz tables, in the background
+@admin_bp.route('/jobs/rebuild/<any(user_stats, leaderboards, search_index):target>', methods=['POST'])
+@login_required
+def rebuild(target):
+    if not current_user.is_admin:
+        flash('Access restricted to administrators only.', 'danger')
+        return redirect(url_for('user.dashboard'))
+
+    job = jobs.enqueue(f'rebuild_{target}', created_by=current_user.id)
+    description = target.replace('_', ' ')
+    flash_job(job, f'Rebuilt the {description}.', f'Rebuilding the {description}')
+    return redirect(url_for('admin.job_list'))
@@ -0,0 +1,49 @@
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect, text
+from database import db
+from search import init_search_index
+
+# The schema is versioned with Alembic migrations (migrations/, `flask db
+# migrate` to write a new one), applied by init_db(). Databases created before
+# there were migrations have no alembic_version table: init_db() first brings
+# them to the baseline revision with ADDED_COLUMNS and the model indexes, then
+# records that revision. ADDED_COLUMNS is therefore frozen; schema changes
+# are new migrations.
+
+BASELINE_REVISION = '0001'
+
+ADDED_COLUMNS = [
+    # (table, column, DDL)
+    ('quiz', 'revision', 'INTEGER NOT NULL DEFAULT 1'),
+    ('score', 'submission_id', 'VARCHAR(32)'),
+    ('quiz', 'pool_size', 'INTEGER'),
+    ('quiz', 'pool_strata', 'VARCHAR(10)'),
+    ('question', 'tag', 'VARCHAR(50)'),
+    ('question', 'difficulty', 'VARCHAR(10)'),
+    ('quiz_attempt', 'seed', 'INTEGER'),
+    ('quiz_attempt', 'question_ids', "TEXT NOT NULL DEFAULT ''"),
+]
+
+def upgrade_schema():
+    """Bring a database created before migrations to the baseline revision."""
+    inspector = inspect(db.engine)
+    with db.engine.begin() as connection:
+        for table, column, ddl in ADDED_COLUMNS:
+            existing = {col['name'] for col in inspector.get_columns(table)}
+            if column not in existing:
+                connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+        # Indexes declared on the models (including those of added columns)
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+def init_db():
+    """Apply the pending migrations and create the search index. Safe to run repeatedly."""
+    tables = inspect(db.engine).get_table_names()
+    if tables and 'alembic_version' not in tables:
+        db.create_all()
+        upgrade_schema()
+        stamp(revision=BASELINE_REVISION)
+    upgrade()
+    init_search_index()
@@ -0,0 +1,181 @@
+import re
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import event, text
+from sqlalchemy.orm import contains_eager, joinedload
+from database import db, Subject, Chapter, Quiz, Question
+
+# Quiz search backed by an SQLite FTS5 index.
+#
+# One row per quiz (rowid = quiz.id) holding the quiz title and remarks, its
+# chapter and subject names and the text of all of its questions. Model hooks
+# below re-index the affected quizzes inside the same transaction as the write,
+# so the index never drifts from the tables. On other databases, or when
+# SEARCH_BACKEND is not 'fts5', searching falls back to ILIKE filters.
+
+SEARCH_TABLE = 'quiz_search'
+SEARCH_COLUMNS = ('title', 'remarks', 'chapter_name', 'subject_name', 'question_text')
+# bm25() column weights, in SEARCH_COLUMNS order: a hit in the title counts
+# most, then the subject/chapter names, then remarks and question text.
+SEARCH_WEIGHTS = (10.0, 2.0, 4.0, 4.0, 1.0)
+
+_fts_enabled = False
+
+def init_search(app):
+    """Search ``app``'s quizzes with FTS5 if it is configured and the database is SQLite."""
+    global _fts_enabled
+    with app.app_context():
+        _fts_enabled = app.config['SEARCH_BACKEND'] == 'fts5' and db.engine.dialect.name == 'sqlite'
+
+def init_search_index():
+    """Create the FTS5 table if needed (see ``flask init-db``). Call in an app context."""
+    if not _fts_enabled:
+        return
+
+    with db.engine.begin() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {'name': SEARCH_TABLE},
+        ).first()
+        if not exists:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5("
+                f"{', '.join(SEARCH_COLUMNS)}, tokenize = 'unicode61 remove_diacritics 2')"
+            ))
+            reindex_quizzes(connection)
+
+def reindex_quizzes(connection, quiz_ids=None):
+    """Rewrite the index rows of ``quiz_ids`` (or of every quiz) from the tables."""
+    where = ''
+    params = {}
+    if quiz_ids is not None:
+        if not quiz_ids:
+            return
+        placeholders = ', '.join(f':id{i}' for i in range(len(quiz_ids)))
+        params = {f'id{i}': quiz_id for i, quiz_id in enumerate(quiz_ids)}
+        where = f'WHERE quiz.id IN ({placeholders})'
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})'), params)
+    else:
+        connection.execute(text(f'DELETE FROM {SEARCH_TABLE}'))
+
+    connection.execute(text(f"""
+        INSERT INTO {SEARCH_TABLE} (rowid, {', '.join(SEARCH_COLUMNS)})
+        SELECT quiz.id, quiz.title, coalesce(quiz.remarks, ''), chapter.name, subject.name,
+               coalesce((SELECT group_concat(question.question_text, ' ')
+                         FROM question WHERE question.quiz_id = quiz.id), '')
+        FROM quiz
+        JOIN chapter ON chapter.id = quiz.chapter_id
+        JOIN subject ON subject.id = chapter.subject_id
+        {where}
+    """), params)
+
+def remove_quizzes(connection, quiz_ids):
+    """Drop the index rows of deleted quizzes (for deletes that bypass the ORM)."""
+    if _fts_enabled and quiz_ids:
+        reindex_quizzes(connection, sorted(quiz_ids))
+
+def _match_expression(terms, columns=None):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r'\w+', terms.lower())
+    if not words:
+        return None
+    expression = ' AND '.join(f'"{word}"*' for word in words)
+    if columns:
+        return f"{{{' '.join(columns)}}} : ({expression})"
+    return f'({expression})'
+
+
+class RankedPagination(Pagination):
+    """Page of quizzes ordered by FTS5 bm25 rank.
+
+    Every page number is served: ranking sorts all the matches whichever page
+    is asked for, so a deep OFFSET adds little, and there is no key to seek on.
+    """
+
+    uncapped = True
+
+    def _query_items(self):
+        rows = db.session.execute(text(f"""
+            SELECT rowid, count(*) OVER () AS total
+            FROM (SELECT rowid, bm25({SEARCH_TABLE}, {', '.join(map(str, SEARCH_WEIGHTS))}) AS rank
+                  FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match)
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        """), {'match': self._query_args['match'], 'limit': self.per_page,
+               'offset': self._query_offset}).all()
+        self._total = rows[0].total if rows else 0
+
+        ids = [row.rowid for row in rows]
+        quizzes = {quiz.id: quiz for quiz in Quiz.query
+                   .options(joinedload(Quiz.chapter).joinedload(Chapter.subject))
+                   .filter(Quiz.id.in_(ids))}
+        return [quizzes[quiz_id] for quiz_id in ids if quiz_id in quizzes]
+
+    def _query_count(self):
+        if self._total or self.page == 1:
+            return self._total
+        # Past the last page: the window count is unavailable, ask directly
+        return db.session.execute(
+            text(f'SELECT count(*) FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH :match'),
+            {'match': self._query_args['match']},
+        ).scalar()
+
+def search_quizzes(subject_search='', quiz_search='', page=1, per_page=20):
+    """Search quizzes, best matches first.
+
+    ``subject_search`` matches subject and chapter names only; ``quiz_search``
+    matches every indexed field. Returns a Flask-SQLAlchemy style pagination
+    whose pages are all numbered (``uncapped``, see _pagination.html).
+    """
+    if _fts_enabled:
+        clauses = [clause for clause in (
+            _match_expression(subject_search, ('subject_name', 'chapter_name')),
+            _match_expression(quiz_search),
+        ) if clause]
+        if clauses:
+            return RankedPagination(page=page, per_page=per_page, error_out=False,
+                                    match=' AND '.join(clauses))
+
+    query = (Quiz.query.join(Chapter).join(Subject)
+             .options(contains_eager(Quiz.chapter).contains_eager(Chapter.subject)))
+    if subject_search:
+        query = query.filter(Subject.name.ilike(f'%{subject_search}%'))
+    if quiz_search:
+        query = query.filter(Quiz.title.ilike(f'%{quiz_search}%'))
+    pagination = query.order_by(Quiz.title).paginate(page=page, per_page=per_page, error_out=False)
+    pagination.uncapped = True
+    return pagination
+
+
+# Keep the index in step with the tables. after_flush works out which quizzes
+# a flush touched; after_flush_postexec rewrites their rows on the flush's
+# own connection, so the index commits or rolls back with the data.
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_search_changes(session, flush_context):
+    if not _fts_enabled:
+        return
+    pending = session.info.setdefault('search_changes', {'quizzes': set(), 'chapters': set(), 'subjects': set()})
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Quiz):
+            pending['quizzes'].add(obj.id)
+        elif isinstance(obj, Question):
+            pending['quizzes'].add(obj.quiz_id)
+        elif isinstance(obj, Chapter):
+            pending['chapters'].add(obj.id)
+        elif isinstance(obj, Subject):
+            pending['subjects'].add(obj.id)
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _apply_search_changes(session, flush_context):
+    pending = session.info.pop('search_changes', None)
+    if not pending or not any(pending.values()):
+        return
+    quiz_ids = set(pending['quizzes'])
+    if pending['chapters']:
+        quiz_ids.update(session.execute(
+            db.select(Quiz.id).where(Quiz.chapter_id.in_(pending['chapters']))).scalars())
+    if pending['subjects']:
+        quiz_ids.update(session.execute(
+            db.select(Quiz.id).join(Chapter).where(Chapter.subject_id.in_(pending['subjects']))).scalars())
+    quiz_ids.discard(None)
+    reindex_quizzes(session.connection(), sorted(quiz_ids))
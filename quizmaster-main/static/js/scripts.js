@@ -32,35 +32,69 @@ document.addEventListener('DOMContentLoaded', function () {
     });
 });
 
-// Countdown Timer for Quizzes
-function startTimer(duration, display) {
-    let timer = duration, minutes, seconds;
+// Countdown Timer for Quizzes: counts down to the attempt's server-side deadline
+function startTimer(deadline, display, form) {
     const interval = setInterval(function () {
-        minutes = parseInt(timer / 60, 10);
-        seconds = parseInt(timer % 60, 10);
+        const timer = Math.max(Math.round((deadline - Date.now()) / 1000), 0);
+        let minutes = parseInt(timer / 60, 10);
+        let seconds = parseInt(timer % 60, 10);
 
         minutes = minutes < 10 ? "0" + minutes : minutes;
         seconds = seconds < 10 ? "0" + seconds : seconds;
 
         display.textContent = minutes + ":" + seconds;
 
-        if (--timer < 0) {
+        if (timer <= 0) {
             clearInterval(interval);
-            alert('Time is up! Your quiz will be submitted automatically.');
-            document.querySelector('form').submit(); // Automatically submit the quiz
+            form.submit(); // Automatically submit the quiz
+            alert('Time is up! Your quiz has been submitted.');
         }
     }, 1000);
 }
 
-// Initialize the timer if the quiz page has a timer element
+// The selected option of every question, in page order (0 = unanswered)
+function quizAnswers(form) {
+    const answers = [];
+    form.querySelectorAll('.quiz-question').forEach(question => {
+        const checked = question.querySelector('input[type="radio"]:checked');
+        answers.push(checked ? parseInt(checked.value, 10) : 0);
+    });
+    return answers;
+}
+
+// Restore autosaved answers and autosave every change (debounced)
+function startAutosave(form) {
+    const saved = form.getAttribute('data-saved-answers') || '';
+    form.querySelectorAll('.quiz-question').forEach((question, index) => {
+        const option = question.querySelector('input[type="radio"][value="' + saved.charAt(index) + '"]');
+        if (option) {
+            option.checked = true;
+        }
+    });
+
+    let pending = null;
+    form.addEventListener('change', function () {
+        clearTimeout(pending);
+        pending = setTimeout(function () {
+            fetch(form.getAttribute('data-autosave-url'), {
+                method: 'PUT',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({answers: quizAnswers(form)}),
+            });
+        }, 1000);
+    });
+}
+
+// Initialize the timer and autosave if the page shows a quiz attempt
 document.addEventListener('DOMContentLoaded', function () {
+    const form = document.getElementById('quiz-form');
     const timerDisplay = document.getElementById('quiz-timer');
 
-    if (timerDisplay) {
-        const timeDuration = timerDisplay.getAttribute('data-duration'); // Get duration in seconds
-        const durationInSeconds = parseInt(timeDuration.split(':')[0]) * 60 + parseInt(timeDuration.split(':')[1]);
-
-        startTimer(durationInSeconds, timerDisplay);
+    if (form && form.hasAttribute('data-autosave-url')) {
+        startAutosave(form);
+    }
+    if (form && timerDisplay && timerDisplay.hasAttribute('data-deadline')) {
+        startTimer(Date.parse(timerDisplay.getAttribute('data-deadline')), timerDisplay, form);
     }
 });
 
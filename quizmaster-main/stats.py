@@ -0,0 +1,132 @@
+from flask import current_app
+from sqlalchemy import case, delete, event, func, insert, select, update
+from cache import TTLCache, on_commit
+from database import db, User, Subject, Chapter, Quiz, Score, UserStats
+
+# Admin dashboard statistics, computed in two queries and cached in-process.
+
+_dashboard_cache = TTLCache(maxsize=1, name='dashboard_stats')
+
+def _counters():
+    """All dashboard counters in one SELECT of scalar subqueries."""
+    def count(column, *criteria):
+        return select(func.count(column)).where(*criteria).scalar_subquery()
+
+    row = db.session.execute(select(
+        count(User.id, User.is_admin.is_(False)).label('total_users'),
+        count(Subject.id).label('total_subjects'),
+        count(Chapter.id).label('total_chapters'),
+        count(Quiz.id).label('total_quizzes'),
+        count(Score.id).label('quizzes_attempted'),
+    )).one()
+    return row._asdict()
+
+def _recent_scores(limit=10):
+    """Latest attempts joined with user, quiz, chapter and subject names."""
+    rows = db.session.execute(
+        select(
+            User.full_name,
+            Quiz.title.label('quiz_title'),
+            Chapter.name.label('chapter_name'),
+            Subject.name.label('subject_name'),
+            Score.score,
+            Score.total_questions,
+            Score.percentage,
+            Score.time_stamp_of_attempt,
+        )
+        .join(User, Score.user_id == User.id)
+        .join(Quiz, Score.quiz_id == Quiz.id)
+        .join(Chapter, Quiz.chapter_id == Chapter.id)
+        .join(Subject, Chapter.subject_id == Subject.id)
+        .order_by(Score.time_stamp_of_attempt.desc())
+        .limit(limit)
+    )
+    return [row._asdict() for row in rows]
+
+def get_dashboard_stats():
+    """Return ``(stats, recent_scores)`` for the admin dashboard.
+
+    Results are plain dicts so they can be shared between requests; they are
+    kept for ``DASHBOARD_STATS_TTL`` seconds or until a relevant write commits.
+    """
+    cached = _dashboard_cache.get('dashboard')
+    if cached is None:
+        cached = (_counters(), _recent_scores())
+        _dashboard_cache.set('dashboard', cached, ttl=current_app.config['DASHBOARD_STATS_TTL'])
+    return cached
+
+@on_commit(User, Subject, Chapter, Quiz, Score)
+def _invalidate_dashboard(changes):
+    _dashboard_cache.clear()
+
+
+# Per-user summaries (UserStats). The user dashboard reads one row instead of
+# aggregating the student's whole Score history on every page view.
+
+def record_attempt(score):
+    """Fold a new ``score`` into its user's UserStats row.
+
+    Runs in the caller's transaction, so the summary commits (or rolls back)
+    together with the Score itself.
+    """
+    percentage = score.percentage
+    result = db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id == score.user_id)
+        .values(
+            attempt_count=UserStats.attempt_count + 1,
+            percentage_sum=UserStats.percentage_sum + percentage,
+            best_percentage=case(
+                (UserStats.best_percentage < percentage, percentage),
+                else_=UserStats.best_percentage,
+            ),
+            last_attempt_at=score.time_stamp_of_attempt,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.session.add(UserStats(
+            user_id=score.user_id,
+            attempt_count=1,
+            percentage_sum=percentage,
+            best_percentage=percentage,
+            last_attempt_at=score.time_stamp_of_attempt,
+        ))
+
+def rebuild_user_stats(connection, user_ids=None):
+    """Recompute UserStats from the Score table, for ``user_ids`` or everyone."""
+    summary = (
+        select(
+            Score.user_id,
+            func.count(Score.id),
+            func.sum(Score.percentage),
+            func.max(Score.percentage),
+            func.max(Score.time_stamp_of_attempt),
+        )
+        .group_by(Score.user_id)
+    )
+    clear = delete(UserStats)
+    if user_ids is not None:
+        summary = summary.where(Score.user_id.in_(user_ids))
+        clear = clear.where(UserStats.user_id.in_(user_ids))
+
+    connection.execute(clear)
+    connection.execute(insert(UserStats).from_select(
+        ['user_id', 'attempt_count', 'percentage_sum', 'best_percentage', 'last_attempt_at'],
+        summary,
+    ))
+
+# Deleting scores (e.g. through the quiz/chapter/subject cascades) makes the
+# owners' summaries stale; rebuild them inside the same transaction.
+
+@event.listens_for(db.session, 'after_flush')
+def _collect_deleted_scores(session, flush_context):
+    user_ids = {obj.user_id for obj in session.deleted if isinstance(obj, Score)}
+    if user_ids:
+        session.info.setdefault('stale_user_stats', set()).update(user_ids)
+
+@event.listens_for(db.session, 'after_flush_postexec')
+def _rebuild_stale_user_stats(session, flush_context):
+    user_ids = session.info.pop('stale_user_stats', None)
+    if user_ids:
+        rebuild_user_stats(session.connection(), user_ids)
@@ -0,0 +1,85 @@
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from database import db, User, Subject, Chapter, Quiz, Question, Score
+from leaderboard import rebuild_leaderboards
+from main import create_app, start_services
+from schema import init_db
+from search import reindex_quizzes
+from stats import rebuild_user_stats
+
+# One app for the whole run, on a temporary SQLite database created with
+# init_db() and filled with a catalogue large enough for a per-row query
+# (an N+1) or a table scan to show. Background work runs inline.
+
+SUBJECTS, CHAPTERS, QUIZZES, QUESTIONS = 20, 5, 4, 5  # CHAPTERS per subject, QUIZZES per chapter, ...
+USERS, SCORES = 50, 2000
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}"
+        SCORE_WRITE_BEHIND = False
+        SCORE_JOURNAL_DIR = str(tmp_path_factory.mktemp('score_journal'))
+        JOB_WORKERS = 0
+        PASSWORD_HASH_WORKERS = 0
+        PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        init_db()
+        seed(db.session)
+    start_services(app)
+    return app
+
+@pytest.fixture(scope='session')
+def admin(app):
+    with app.app_context():
+        return User.query.filter_by(is_admin=True).one()
+
+@pytest.fixture
+def admin_client(app, admin):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = admin.get_id()
+        session['_fresh'] = True
+    return client
+
+def seed(session):
+    today, now = date.today(), datetime.utcnow()
+    session.execute(insert(User), [
+        {'id': n + 1, 'username': f'user{n}', 'email': f'user{n}@example.com', 'password': '-',
+         'full_name': f'User {n}', 'dob': date(2000, 1, 1), 'is_admin': n == 0}
+        for n in range(USERS)
+    ])
+    session.execute(insert(Subject), [{'id': s + 1, 'name': f'Subject {s}'} for s in range(SUBJECTS)])
+    chapter_ids = range(1, SUBJECTS * CHAPTERS + 1)
+    session.execute(insert(Chapter), [{'id': c, 'name': f'Chapter {c}', 'subject_id': (c - 1) // CHAPTERS + 1}
+                                      for c in chapter_ids])
+    quiz_ids = range(1, len(chapter_ids) * QUIZZES + 1)
+    session.execute(insert(Quiz), [{'id': q, 'title': f'Quiz {q}', 'chapter_id': (q - 1) // QUIZZES + 1,
+                                    'date_of_quiz': today, 'time_duration': '00:30'} for q in quiz_ids])
+    session.execute(insert(Question), [
+        {'quiz_id': q, 'question_text': f'Question {n}?', 'option1': 'A', 'option2': 'B', 'correct_option': 1}
+        for q in quiz_ids for n in range(QUESTIONS)
+    ])
+    session.execute(insert(Score), [
+        {'user_id': 2 + n % (USERS - 1), 'quiz_id': 1 + n % len(quiz_ids), 'score': n % (QUESTIONS + 1),
+         'total_questions': QUESTIONS, 'percentage': n % (QUESTIONS + 1) * 100 / QUESTIONS,
+         'time_stamp_of_attempt': now - timedelta(minutes=n)}
+        for n in range(SCORES)
+    ])
+    connection = session.connection()
+    rebuild_user_stats(connection)
+    rebuild_leaderboards(connection)
+    reindex_quizzes(connection)
+    session.commit()
@@ -0,0 +1,15 @@
+from sqlalchemy import insert
+from catalogue import get_catalogue
+from database import db, Subject, Chapter
+
+def test_form_accepts_subject_created_by_another_process(app, admin_client):
+    with app.app_context():
+        get_catalogue()
+        # As another worker would: this process's revision does not move
+        with db.engine.begin() as conn:
+            subject_id = conn.execute(insert(Subject).values(name='Added elsewhere', description='')
+                                      .returning(Subject.id)).scalar_one()
+    response = admin_client.post('/admin/chapters', data={'name': 'New chapter', 'subject_id': subject_id})
+    assert response.status_code == 302
+    with app.app_context():
+        assert db.session.scalar(db.select(Chapter.subject_id).filter_by(name='New chapter')) == subject_id
@@ -0,0 +1,29 @@
+from sqlalchemy import update
+from database import db, User
+from identity import load_user
+
+def client_for(app, user):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = user.get_id()
+        session['_fresh'] = True
+    return client
+
+def test_password_change_elsewhere_ends_sessions(app):
+    with app.app_context():
+        user = User.query.filter_by(username='user49').one()
+        old_id = user.get_id()
+        client = client_for(app, user)
+        assert client.get('/user/dashboard').status_code == 200
+        # As another worker would: this process's snapshot is not dropped
+        with db.engine.begin() as conn:
+            conn.execute(update(User).where(User.id == user.id).values(password='changed-elsewhere'))
+        db.session.expire(user)
+        assert load_user(old_id) is not None  # The snapshot still matches until it expires
+        assert load_user(user.get_id()) is not None  # A newer session reloads it
+        assert load_user(old_id) is None
+    assert client.get('/user/dashboard').status_code == 302
+
+def test_plain_id_is_not_a_session(app, admin):
+    with app.app_context():
+        assert load_user(str(admin.id)) is None
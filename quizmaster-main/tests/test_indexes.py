@@ -0,0 +1,9 @@
+import pytest
+from commands import hot_queries
+from queries import explain_query_plan, is_full_scan
+
+@pytest.mark.parametrize('name', sorted(hot_queries()))
+def test_hot_query_uses_an_index(app, name):
+    with app.app_context():
+        plan = explain_query_plan(hot_queries()[name])
+    assert not [detail for detail in plan if is_full_scan(detail)], f'{name}: {"; ".join(plan)}'
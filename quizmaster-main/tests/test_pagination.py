@@ -0,0 +1,10 @@
+def test_numbered_pages_stop_at_the_cap(app, admin_client):
+    last = app.config['MAX_OFFSET_PAGES']
+    assert admin_client.get(f'/admin/quizzes?page={last}').status_code == 200
+    assert admin_client.get(f'/admin/quizzes?page={last + 1}').status_code == 404
+
+def test_keyset_pages_go_past_the_cap(app, admin_client):
+    after = app.config['MAX_OFFSET_PAGES'] * app.config['PER_PAGE']
+    response = admin_client.get(f'/admin/quizzes?page=50&after={after}')
+    assert response.status_code == 200
+    assert f'<td>{after + 1}</td>'.encode() in response.data
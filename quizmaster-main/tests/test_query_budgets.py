@@ -0,0 +1,8 @@
+import pytest
+from commands import QUERY_BUDGETS, page_query_count
+
+@pytest.mark.parametrize('path', QUERY_BUDGETS)
+def test_admin_page_within_query_budget(app, admin, path):
+    used, status = page_query_count(app, admin, path)
+    assert status == 200
+    assert used <= QUERY_BUDGETS[path], f'{path} issued {used} queries, budget {QUERY_BUDGETS[path]}'